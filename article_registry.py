@@ -0,0 +1,159 @@
+"""
+Общий реестр отслеживаемых товаров
+Используется сборщиком статистики, Telegram ботом и веб-панелью
+"""
+import asyncio
+import csv
+import logging
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Тестовый каталог по умолчанию: артикул -> (название, начальная цена)
+DEFAULT_ARTICLES: Dict[str, Tuple[str, float]] = {
+    "123456": ("Смартфон Xiaomi Redmi Note 12", 19999.99),
+    "789012": ("Наушники JBL Tune 510BT", 3499.99),
+    "345678": ("Ноутбук ASUS VivoBook 15", 54999.99),
+    "901234": ("Часы Apple Watch Series 9", 42999.99),
+    "567890": ("Планшет Samsung Galaxy Tab S9", 72999.99),
+    "234567": ("Фитнес-браслет Huawei Band 8", 2999.99),
+    "890123": ("Колонка Яндекс Станция Мини 2", 8999.99),
+    "456789": ("Монитор LG 24MP400-B", 12999.99),
+    "012345": ("Клавиатура Logitech MX Keys", 11999.99),
+    "678901": ("Мышь беспроводная Razer Viper", 6999.99)
+}
+
+
+class ArticleRegistry:
+    """
+    Реестр товаров на массивах
+    Артикулы и названия хранятся списками, цены - в array('d'),
+    а словарь index отображает артикул в позицию в этих массивах
+    """
+
+    def __init__(self):
+        self.codes: List[str] = []
+        self.names: List[str] = []
+        self.prices = array("d")
+        self.index: Dict[str, int] = {}
+        # Максимальный updated_at из БД - точка отсчета для инкрементального обновления
+        self.last_updated_at: Optional[datetime] = None
+
+    @classmethod
+    def with_defaults(cls) -> "ArticleRegistry":
+        """Реестр с тестовым каталогом"""
+        registry = cls()
+        for code, (name, price) in DEFAULT_ARTICLES.items():
+            registry.upsert(code, name, price)
+        return registry
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def __iter__(self) -> Iterator[Tuple[str, str, float]]:
+        """Перебор (артикул, название, цена)"""
+        return zip(self.codes, self.names, self.prices)
+
+    def clear(self):
+        """Очистка реестра"""
+        self.codes.clear()
+        self.names.clear()
+        del self.prices[:]
+        self.index.clear()
+        self.last_updated_at = None
+
+    def upsert(self, code: str, name: str, price: float):
+        """Добавление или обновление товара"""
+        i = self.index.get(code)
+        if i is None:
+            self.index[code] = len(self.codes)
+            self.codes.append(code)
+            self.names.append(name)
+            self.prices.append(float(price or 0))
+        else:
+            self.names[i] = name
+            self.prices[i] = float(price or 0)
+
+    def get_name(self, code: str, default: Optional[str] = None) -> Optional[str]:
+        i = self.index.get(code)
+        return default if i is None else self.names[i]
+
+    def get_price(self, code: str, default: float = 0.0) -> float:
+        i = self.index.get(code)
+        return default if i is None else self.prices[i]
+
+    def set_price(self, code: str, price: float):
+        self.prices[self.index[code]] = price
+
+    # Загрузка из файлов
+    def load_csv(self, path: str) -> int:
+        """Загрузка из CSV с колонками article_code, article_name, current_price"""
+        count = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self.upsert(row["article_code"], row["article_name"], float(row["current_price"] or 0))
+                count += 1
+        logger.info(f"Загружено {count} товаров из {path}")
+        return count
+
+    def load_parquet(self, path: str) -> int:
+        """Загрузка из Parquet с теми же колонками, что и CSV"""
+        import pandas as pd
+
+        frame = pd.read_parquet(path, columns=["article_code", "article_name", "current_price"])
+        for code, name, price in frame.itertuples(index=False, name=None):
+            self.upsert(str(code), name, price)
+        logger.info(f"Загружено {len(frame)} товаров из {path}")
+        return len(frame)
+
+    # Загрузка из БД
+    async def refresh_from_db(self, db) -> int:
+        """
+        Загрузка товаров из таблицы articles
+        При повторных вызовах запрашиваются только изменившиеся с прошлого раза
+        """
+        articles = await db.get_articles_updated_since(self.last_updated_at)
+        if articles and self.last_updated_at is None:
+            # Первая загрузка из БД заменяет каталог по умолчанию
+            self.clear()
+
+        for article in articles:
+            self.upsert(article.article_code, article.article_name, article.current_price)
+            if self.last_updated_at is None or article.updated_at > self.last_updated_at:
+                self.last_updated_at = article.updated_at
+
+        if articles:
+            logger.info(f"Реестр товаров обновлен: {len(articles)} изменений, всего {len(self)}")
+        return len(articles)
+
+    async def run_refresh(self, db, interval: float = 60.0):
+        """Периодическое обновление из БД (запускается задачей, останавливается отменой)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_from_db(db)
+            except Exception as e:
+                logger.error(f"Ошибка обновления реестра товаров: {e}")
+
+
+_registry: Optional[ArticleRegistry] = None
+
+
+def get_article_registry() -> ArticleRegistry:
+    """Общий реестр товаров процесса (по умолчанию - тестовый каталог)"""
+    global _registry
+    if _registry is None:
+        _registry = ArticleRegistry.with_defaults()
+    return _registry
+
+
+def set_article_registry(registry: ArticleRegistry):
+    """Замена общего реестра (например, загруженным из файла)"""
+    global _registry
+    _registry = registry
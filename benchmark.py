@@ -0,0 +1,632 @@
+"""
+Бенчмарки производительности Ozon Stats Bot
+
+Запуск:
+    python benchmark.py bulk-orders --orders 10000 --batch-size 1000
+    python benchmark.py concurrent-orders --writers 60
+    python benchmark.py dashboard-stats --iterations 1000
+    python benchmark.py webhook --updates 2000 --clients 50
+    python benchmark.py simulate --articles 100000 --seed 42
+    python benchmark.py aggregate --sizes 10000 100000 1000000
+    python benchmark.py broadcast --chats 300 --rate 30
+    python benchmark.py leader-election --replicas 3 --duration 20
+    python benchmark.py seller-reports --sellers 200 --articles 500 --workers 1 2 4 8
+    python benchmark.py collector --skus 20000 --batch-sizes 10 50 200 --concurrency 1 8
+
+Внимание: бенчмарки, работающие с БД, пишут тестовые данные
+в базу из настроек .env
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+
+from database import Database
+
+load_dotenv()
+
+
+def create_database() -> Database:
+    """Создание подключения к БД из настроек окружения"""
+    return Database(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        database=os.getenv("DB_NAME", "ozon_bot_db"),
+        user=os.getenv("DB_USER", "ozon_bot_user"),
+        password=os.getenv("DB_PASSWORD", "password123"),
+        min_pool_size=int(os.getenv("DB_POOL_MIN", "1")),
+        max_pool_size=int(os.getenv("DB_POOL_MAX", "10"))
+    )
+
+
+def print_result(name: str, count: int, elapsed: float, unit: str = "оп/с"):
+    """Вывод результата замера"""
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    print(f"{name:<30} {count:>10} за {elapsed:8.3f} с  ->  {rate:12.1f} {unit}")
+
+
+def print_latency(name: str, samples: list):
+    """Вывод перцентилей задержки в миллисекундах"""
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f"{name:<30} p50 = {p50:8.3f} мс   p99 = {p99:8.3f} мс   ({len(samples)} замеров)")
+
+
+# ========== ЗАКАЗЫ ==========
+async def bench_bulk_orders(args):
+    """Сравнение построчного save_order и пакетного save_orders_bulk"""
+    db = create_database()
+    if not await db.connect():
+        print("❌ Не удалось подключиться к БД")
+        return
+
+    try:
+        articles = [a.article_code for a in await db.get_all_articles()]
+        if not articles:
+            print("❌ В таблице articles нет товаров")
+            return
+
+        now = datetime.now()
+        orders = [(random.choice(articles), now) for _ in range(args.orders)]
+
+        start = time.perf_counter()
+        for article_code, order_time in orders:
+            await db.save_order(article_code, order_time)
+        print_result("save_order (построчно)", len(orders), time.perf_counter() - start, "заказов/с")
+
+        start = time.perf_counter()
+        for i in range(0, len(orders), args.batch_size):
+            await db.save_orders_bulk(orders[i:i + args.batch_size])
+        print_result(f"save_orders_bulk ({args.batch_size})", len(orders), time.perf_counter() - start, "заказов/с")
+    finally:
+        await db.close()
+
+
+async def nested_acquire_save_order(db: Database, article_code: str, order_time: datetime):
+    """Прежняя схема save_order: второй acquire при удержании первого соединения"""
+    async with db.pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO orders (article_code, order_time, hour_of_day)
+            VALUES ($1, $2, $3)
+        """, article_code, order_time, order_time.hour)
+
+        async with db.pool.acquire() as stats_conn:
+            await stats_conn.execute("""
+                INSERT INTO daily_stats (article_code, date, hour, orders_count)
+                VALUES ($1, $2, $3, 1)
+                ON CONFLICT (article_code, date, hour) 
+                DO UPDATE SET orders_count = daily_stats.orders_count + 1
+            """, article_code, order_time.date(), order_time.hour)
+
+
+async def bench_concurrent_orders(args):
+    """Нагрузочный тест: одновременные писатели против пула соединений"""
+    db = create_database()
+    if not await db.connect():
+        print("❌ Не удалось подключиться к БД")
+        return
+
+    try:
+        articles = [a.article_code for a in await db.get_all_articles()]
+        if not articles:
+            print("❌ В таблице articles нет товаров")
+            return
+
+        async def writer(save):
+            for _ in range(args.orders_per_writer):
+                await save(random.choice(articles), datetime.now())
+
+        variants = [
+            ("вложенный acquire (старый)", lambda code, t: nested_acquire_save_order(db, code, t)),
+            ("один запрос (save_order)", db.save_order),
+        ]
+        print(f"Писателей: {args.writers}, размер пула: {db.max_pool_size}")
+
+        for name, save in variants:
+            start = time.perf_counter()
+            tasks = [asyncio.create_task(writer(save)) for _ in range(args.writers)]
+            done, pending = await asyncio.wait(tasks, timeout=args.timeout)
+            elapsed = time.perf_counter() - start
+
+            if pending:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                print(f"{name:<30} ❌ пул заблокирован: {len(pending)} писателей не завершились за {args.timeout} с")
+            else:
+                print_result(name, args.writers * args.orders_per_writer, elapsed, "заказов/с")
+    finally:
+        await db.close()
+
+
+# ========== СИМУЛЯЦИЯ ==========
+async def bench_simulate(args):
+    """Скорость генерации заказов: MockOzonAPI против VectorizedMockOzonAPI"""
+    from article_registry import ArticleRegistry
+    from ozon_stats_bot import MockOzonAPI
+    from order_simulator import VectorizedMockOzonAPI
+
+    vectorized = VectorizedMockOzonAPI.synthetic(args.articles, seed=args.seed)
+    hours = range(8, 8 + args.hours)
+
+    if args.articles <= args.scalar_limit:
+        registry = ArticleRegistry()
+        for article, name, price in zip(vectorized.articles, vectorized.names, vectorized.prices):
+            registry.upsert(str(article), str(name), float(price))
+        scalar = MockOzonAPI(registry)
+
+        start = time.perf_counter()
+        for hour in hours:
+            scalar.get_stats_for_hour(hour)
+        print_result("MockOzonAPI", args.articles * args.hours, time.perf_counter() - start, "артикулов/с")
+
+    start = time.perf_counter()
+    for hour in hours:
+        vectorized.simulate_hour(hour)
+    print_result("VectorizedMockOzonAPI", args.articles * args.hours, time.perf_counter() - start, "артикулов/с")
+
+
+# ========== ОТЧЕТЫ ==========
+def legacy_report_aggregates(stats):
+    """Прежняя схема: сортировка для топа и отдельные проходы для сумм и max"""
+    top = sorted(stats, key=lambda x: x.hourly_orders, reverse=True)[:3]
+    # generate_hourly_report
+    sum(s.hourly_orders for s in stats)
+    sum(s.daily_orders for s in stats)
+    # generate_summary_report
+    sum(s.hourly_orders for s in stats)
+    sum(s.daily_orders for s in stats)
+    max(stats, key=lambda x: x.hourly_orders)
+    return top
+
+
+async def bench_aggregate(args):
+    """Итоги и топ-K: несколько проходов с сортировкой против одного прохода с кучей"""
+    from ozon_stats_bot import aggregate_stats
+    from order_simulator import VectorizedMockOzonAPI
+
+    for size in args.sizes:
+        stats = VectorizedMockOzonAPI.synthetic(size, seed=args.seed).get_stats_for_hour(12)
+
+        start = time.perf_counter()
+        legacy_report_aggregates(stats)
+        print_result(f"сортировка + проходы ({size})", size, time.perf_counter() - start, "артикулов/с")
+
+        start = time.perf_counter()
+        aggregate_stats(stats, top_k=args.top_k)
+        print_result(f"один проход ({size})", size, time.perf_counter() - start, "артикулов/с")
+
+
+# ========== РАССЫЛКА ==========
+async def start_fake_bot_api(port: int, rate_limit_every: int = 0):
+    """
+    Локальный сервер, имитирующий sendMessage Bot API
+    rate_limit_every > 0 - каждый N-й запрос получает 429 с retry_after = 1
+    """
+    from aiohttp import web
+
+    counter = {"requests": 0}
+
+    async def read_payload(request) -> dict:
+        # aiohttp-клиенты шлют JSON, python-telegram-bot - форму
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    async def send_message(request):
+        counter["requests"] += 1
+        payload = await read_payload(request)
+        if rate_limit_every and counter["requests"] % rate_limit_every == 0:
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1}
+            }, status=429)
+        return web.json_response({"ok": True, "result": {
+            "message_id": counter["requests"],
+            "date": int(time.time()),
+            "chat": {"id": int(payload["chat_id"]), "type": "private"},
+            "text": payload.get("text", "")
+        }})
+
+    async def get_me(_):
+        return web.json_response({"ok": True, "result": {
+            "id": 1, "is_bot": True, "first_name": "Ozon Stats", "username": "ozon_stats_test_bot"
+        }})
+
+    async def other_method(_):
+        return web.json_response({"ok": True, "result": True})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/sendMessage", send_message)
+    app.router.add_post("/bot{token}/getMe", get_me)
+    app.router.add_post("/bot{token}/{method}", other_method)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, counter
+
+
+async def bench_broadcast(args):
+    """Скорость рассылки через локальный фейковый Bot API"""
+    from broadcast import BroadcastEngine
+    from report_store import ReportArtifactStore
+
+    runner, counter = await start_fake_bot_api(args.port, args.rate_limit_every)
+    try:
+        engine = BroadcastEngine(
+            token="TEST",
+            api_base=f"http://127.0.0.1:{args.port}",
+            global_rate=args.rate,
+            workers=args.workers
+        )
+        artifact = await ReportArtifactStore().get_or_render(
+            "benchmark", datetime.now(),
+            lambda: [f"Тестовый отчет, часть {i + 1}" for i in range(args.parts)]
+        )
+        result = await engine.broadcast(range(1, args.chats + 1), artifact)
+
+        print_result("BroadcastEngine", result.sent, result.elapsed, "сообщений/с")
+        print(f"Запросов к API: {counter['requests']}, повторов: {result.retries}, "
+              f"чатов с ошибкой: {result.failed_chats}")
+    finally:
+        await runner.cleanup()
+
+
+# ========== WEBHOOK ==========
+def recorded_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Обновление Telegram с текстовым сообщением (как приходит в webhook)"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+        "text": text
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+async def bench_webhook(args):
+    """Обработка обновлений в режиме webhook: FastAPI + фейковый Bot API"""
+    import aiohttp
+    import uvicorn
+    from fastapi import FastAPI
+
+    import telegram_bot
+
+    runner, counter = await start_fake_bot_api(args.api_port)
+    telegram_bot.TELEGRAM_TOKEN = "TEST"
+    telegram_bot.TELEGRAM_API_BASE = f"http://127.0.0.1:{args.api_port}"
+
+    web_app = FastAPI()
+    # Без БД: /help и кнопки меню отвечают без запросов к базе
+    bot_app = telegram_bot.build_application(webhook=True, concurrent_updates=args.concurrency)
+    bot_app.bot_data["db"] = None
+    bot_app.bot_data["owns_db"] = False
+    telegram_bot.mount_webhook(web_app, bot_app, secret_token=None)
+    await telegram_bot.start_webhook(bot_app, webhook_url=None)
+
+    server = uvicorn.Server(uvicorn.Config(web_app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        texts = ["/help", "❓ Помощь", "/start"]
+        updates = [recorded_update(i, 1000 + i % 500, texts[i % len(texts)]) for i in range(args.updates)]
+        # /start отвечает двумя сообщениями
+        expected = sum(2 if update["message"]["text"] == "/start" else 1 for update in updates)
+        url = f"http://127.0.0.1:{args.port}{telegram_bot.TELEGRAM_WEBHOOK_PATH}"
+
+        latencies = []
+        semaphore = asyncio.Semaphore(args.clients)
+        async with aiohttp.ClientSession() as session:
+            async def post(update):
+                async with semaphore:
+                    start = time.perf_counter()
+                    async with session.post(url, json=update) as response:
+                        response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(post(update) for update in updates))
+            while counter["requests"] < expected and time.perf_counter() - start < args.timeout:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+
+        print_result("обновлений обработано", args.updates, elapsed, "обновлений/с")
+        print(f"Ответов в Bot API: {counter['requests']} из {expected}")
+        print_latency("ответ webhook", latencies)
+        for name, metrics in telegram_bot.router.get_metrics().items():
+            if metrics["count"]:
+                print(f"  {name:<12} вызовов: {metrics['count']:>6}, среднее: {metrics['avg_ms']:.2f} мс, "
+                      f"ошибок: {metrics['errors']}")
+    finally:
+        server.should_exit = True
+        await server_task
+        await telegram_bot.stop_webhook(bot_app)
+        await runner.cleanup()
+
+
+# ========== ДАШБОРД ==========
+async def sequential_dashboard_counters(db: Database, target_date: date):
+    """Прежняя схема: три последовательных запроса счетчиков"""
+    async with db.pool.acquire() as conn:
+        await conn.fetchval("""
+            SELECT COALESCE(SUM(orders_count), 0)
+            FROM daily_stats 
+            WHERE date = $1
+        """, target_date)
+        await conn.fetchval("SELECT COUNT(*) FROM bot_users WHERE is_active = TRUE")
+        await conn.fetchval("SELECT COUNT(*) FROM articles")
+
+
+async def bench_dashboard_stats(args):
+    """Задержка счетчиков дашборда: три запроса против одного"""
+    db = create_database()
+    if not await db.connect():
+        print("❌ Не удалось подключиться к БД")
+        return
+
+    try:
+        today = date.today()
+        variants = [
+            ("три запроса (старый)", lambda: sequential_dashboard_counters(db, today)),
+            ("один запрос", lambda: db.get_dashboard_counters(today)),
+        ]
+
+        for name, run in variants:
+            samples = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                await run()
+                samples.append(time.perf_counter() - start)
+            print_latency(name, samples)
+    finally:
+        await db.close()
+
+
+# ========== ОТЧЕТЫ ПРОДАВЦОВ ==========
+async def bench_seller_reports(args):
+    """Сбор и формирование отчетов продавцов: цикл событий против пула процессов"""
+    from ozon_stats_bot import MockOzonAPI
+    from seller_reports import ShardedReportRunner, render_seller_report, synthetic_catalogs
+
+    catalogs = synthetic_catalogs(args.sellers, args.articles, seed=args.seed)
+    print(f"Продавцов: {args.sellers}, товаров у каждого: {args.articles}, часов: {args.hours}")
+
+    apis = {seller_id: MockOzonAPI(registry) for seller_id, registry in catalogs.items()}
+    start = time.perf_counter()
+    for hour in range(12, 12 + args.hours):
+        for seller_id, api in apis.items():
+            render_seller_report(seller_id, api, hour, args.detail_limit)
+            # Как в боте: между продавцами цикл событий может обслужить другие задачи
+            await asyncio.sleep(0)
+    print_result("в цикле событий", args.sellers * args.hours, time.perf_counter() - start, "отчетов/с")
+
+    for workers in args.workers:
+        runner = ShardedReportRunner(catalogs, workers=workers, batch_size=args.batch_size,
+                                     detail_limit=args.detail_limit, seed=args.seed)
+        try:
+            await runner.warm_up()
+            count = 0
+            start = time.perf_counter()
+            for hour in range(12, 12 + args.hours):
+                async for _ in runner.iter_reports(hour):
+                    count += 1
+            print_result(f"процессов: {workers}", count, time.perf_counter() - start, "отчетов/с")
+        finally:
+            runner.close()
+
+
+# ========== СБОР ПО HTTP ==========
+async def bench_collector(args):
+    """Скорость сбора статистики через локальную заглушку API"""
+    from ozon_client import HttpOzonAPI, start_stub_ozon_api
+    from seller_reports import synthetic_catalogs
+
+    # У заглушки и клиента свои копии каталога, как у сервера и бота
+    server_registry = synthetic_catalogs(1, args.skus, seed=args.seed)["seller-0"]
+    client_registry = synthetic_catalogs(1, args.skus, seed=args.seed)["seller-0"]
+    runner, counter = await start_stub_ozon_api(args.port, server_registry,
+                                                fail_every=args.fail_every, latency=args.latency)
+    try:
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                api = HttpOzonAPI(f"http://127.0.0.1:{args.port}", client_registry,
+                                  batch_size=batch_size, concurrency=concurrency)
+                try:
+                    start = time.perf_counter()
+                    stats = await api.get_stats_for_hour(12)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    await api.close()
+                metrics = api.get_metrics()
+                print_result(f"пачка {batch_size}, потоков {concurrency}", len(stats), elapsed, "SKU/с")
+                print(f"  запросов: {metrics['requests']}, повторов: {metrics['retries']}, "
+                      f"неудачных пачек: {metrics['failed_batches']}")
+    finally:
+        await runner.cleanup()
+
+
+# ========== ВЫБОР ЛИДЕРА ==========
+async def leader_replica(lease_name: str, holder: str, ttl: float, renew_interval: float,
+                         slot_seconds: float, duration: float):
+    """Экземпляр бота: каждые slot_seconds пытается зарегистрировать запуск задачи"""
+    from leader import LeaderElector
+
+    db = create_database()
+    if not await db.connect():
+        return
+    elector = LeaderElector(db, name=lease_name, holder=holder, ttl=ttl, renew_interval=renew_interval)
+    elector_task = asyncio.create_task(elector.run())
+    try:
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            slot = time.time() // slot_seconds * slot_seconds
+            await elector.claim("benchmark", slot)
+            await asyncio.sleep(slot_seconds / 4)
+    finally:
+        elector.stop()
+        elector_task.cancel()
+        await asyncio.gather(elector_task, return_exceptions=True)
+        await db.close()
+
+
+def run_leader_replica(*replica_args):
+    asyncio.run(leader_replica(*replica_args))
+
+
+async def bench_leader_election(args):
+    """Несколько процессов-экземпляров, лидер принудительно завершается посередине"""
+    import multiprocessing
+
+    db = create_database()
+    if not await db.connect() or not await db.ensure_leader_schema():
+        print("❌ Не удалось подключиться к БД")
+        return
+
+    lease_name = f"benchmark-{os.getpid()}-{int(time.time())}"
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    try:
+        started = time.time()
+        for i in range(args.replicas):
+            holder = f"replica-{i}"
+            process = context.Process(
+                target=run_leader_replica,
+                args=(lease_name, holder, args.ttl, args.renew_interval, args.slot, args.duration)
+            )
+            process.start()
+            processes[holder] = process
+
+        # Посередине прогона «роняем» лидера без освобождения аренды
+        await asyncio.sleep(args.duration / 2)
+        async with db.pool.acquire() as conn:
+            leader = await conn.fetchval("SELECT holder FROM scheduler_leases WHERE name = $1", lease_name)
+        if leader in processes:
+            processes[leader].kill()
+            print(f"Лидер {leader} завершен")
+
+        for process in processes.values():
+            await asyncio.to_thread(process.join)
+
+        async with db.pool.acquire() as conn:
+            runs = await conn.fetch(
+                "SELECT slot, holder, token FROM scheduler_runs WHERE job_name = 'benchmark' "
+                "AND slot >= to_timestamp($1) ORDER BY slot", started
+            )
+            await conn.execute("DELETE FROM scheduler_leases WHERE name = $1", lease_name)
+
+        slots = [run["slot"].timestamp() for run in runs]
+        gaps = [b - a for a, b in zip(slots, slots[1:])]
+        expected = int(args.duration / args.slot)
+        print(f"Слотов за прогон: ~{expected}, выполнено: {len(runs)}, "
+              f"держателей: {len({run['holder'] for run in runs})}, "
+              f"маркеров: {sorted({run['token'] for run in runs})}")
+        if gaps:
+            print(f"Наибольший разрыв между запусками: {max(gaps):.1f} с "
+                  f"(шаг {args.slot} с, ttl {args.ttl} с)")
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.kill()
+        await db.close()
+
+
+def main():
+    """Разбор аргументов и запуск бенчмарка"""
+    parser = argparse.ArgumentParser(description="Бенчмарки Ozon Stats Bot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bulk = subparsers.add_parser("bulk-orders", help="Построчная и пакетная запись заказов")
+    bulk.add_argument("--orders", type=int, default=10000)
+    bulk.add_argument("--batch-size", type=int, default=1000)
+    bulk.set_defaults(func=bench_bulk_orders)
+
+    concurrent = subparsers.add_parser("concurrent-orders", help="Голодание пула при одновременной записи заказов")
+    concurrent.add_argument("--writers", type=int, default=60)
+    concurrent.add_argument("--orders-per-writer", type=int, default=20)
+    concurrent.add_argument("--timeout", type=float, default=30.0)
+    concurrent.set_defaults(func=bench_concurrent_orders)
+
+    simulate = subparsers.add_parser("simulate", help="Генерация заказов для большого каталога")
+    simulate.add_argument("--articles", type=int, default=100000)
+    simulate.add_argument("--hours", type=int, default=15)
+    simulate.add_argument("--seed", type=int, default=42)
+    simulate.add_argument("--scalar-limit", type=int, default=100000,
+                          help="Не запускать MockOzonAPI на каталогах больше этого размера")
+    simulate.set_defaults(func=bench_simulate)
+
+    aggregate = subparsers.add_parser("aggregate", help="Итоги и топ-K для отчетов")
+    aggregate.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    aggregate.add_argument("--top-k", type=int, default=3)
+    aggregate.add_argument("--seed", type=int, default=42)
+    aggregate.set_defaults(func=bench_aggregate)
+
+    broadcast = subparsers.add_parser("broadcast", help="Рассылка через фейковый Bot API")
+    broadcast.add_argument("--chats", type=int, default=300)
+    broadcast.add_argument("--parts", type=int, default=1)
+    broadcast.add_argument("--rate", type=float, default=30.0)
+    broadcast.add_argument("--workers", type=int, default=20)
+    broadcast.add_argument("--rate-limit-every", type=int, default=0)
+    broadcast.add_argument("--port", type=int, default=8081)
+    broadcast.set_defaults(func=bench_broadcast)
+
+    sellers = subparsers.add_parser("seller-reports", help="Отчеты продавцов в пуле процессов")
+    sellers.add_argument("--sellers", type=int, default=200)
+    sellers.add_argument("--articles", type=int, default=500)
+    sellers.add_argument("--hours", type=int, default=3)
+    sellers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    sellers.add_argument("--batch-size", type=int, default=8)
+    sellers.add_argument("--detail-limit", type=int, default=None)
+    sellers.add_argument("--seed", type=int, default=42)
+    sellers.set_defaults(func=bench_seller_reports)
+
+    collector = subparsers.add_parser("collector", help="Сбор статистики через HTTP-заглушку API")
+    collector.add_argument("--skus", type=int, default=20000)
+    collector.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 50, 200])
+    collector.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    collector.add_argument("--latency", type=float, default=0.005,
+                           help="Задержка ответа заглушки, с (имитация сети)")
+    collector.add_argument("--fail-every", type=int, default=0)
+    collector.add_argument("--port", type=int, default=8082)
+    collector.add_argument("--seed", type=int, default=42)
+    collector.set_defaults(func=bench_collector)
+
+    leader = subparsers.add_parser("leader-election", help="Отказоустойчивость выбора лидера (процессы)")
+    leader.add_argument("--replicas", type=int, default=3)
+    leader.add_argument("--duration", type=float, default=20.0)
+    leader.add_argument("--slot", type=float, default=1.0)
+    leader.add_argument("--ttl", type=float, default=3.0)
+    leader.add_argument("--renew-interval", type=float, default=1.0)
+    leader.set_defaults(func=bench_leader_election)
+
+    webhook = subparsers.add_parser("webhook", help="Обработка записанных обновлений через webhook")
+    webhook.add_argument("--updates", type=int, default=2000)
+    webhook.add_argument("--clients", type=int, default=50)
+    webhook.add_argument("--concurrency", type=int, default=64)
+    webhook.add_argument("--port", type=int, default=8083)
+    webhook.add_argument("--api-port", type=int, default=8084)
+    webhook.add_argument("--timeout", type=float, default=60.0)
+    webhook.set_defaults(func=bench_webhook)
+
+    dashboard = subparsers.add_parser("dashboard-stats", help="Задержка счетчиков дашборда")
+    dashboard.add_argument("--iterations", type=int, default=1000)
+    dashboard.set_defaults(func=bench_dashboard_stats)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
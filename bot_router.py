@@ -0,0 +1,131 @@
+"""
+Таблица действий Telegram бота: команды и кнопки меню
+Из одной таблицы строятся CommandHandler, клавиатура и разбор нажатий
+"""
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram import KeyboardButton, ReplyKeyboardMarkup, Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+
+from latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+
+@dataclass
+class BotAction:
+    """
+    Действие бота: команда /command, кнопка label в строке row меню
+    и/или нажатия inline-кнопок с callback_data, начинающимися с callback_prefix
+    """
+    name: str
+    handler: Handler
+    command: Optional[str] = None
+    label: Optional[str] = None
+    row: Optional[int] = None
+    description: str = ""
+    callback_prefix: Optional[str] = None
+
+
+class BotRouter:
+    """
+    Маршрутизатор действий
+    Кнопки ищутся по тексту в словаре (O(1)), время каждого обработчика
+    пишется в гистограмму задержек
+    """
+
+    def __init__(self, fallback: Optional[Handler] = None):
+        self.actions: Dict[str, BotAction] = {}
+        self.by_label: Dict[str, BotAction] = {}
+        self.fallback = fallback
+
+        # Метрики по действиям
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, name: str, handler: Handler, command: Optional[str] = None,
+            label: Optional[str] = None, row: Optional[int] = None, description: str = "",
+            callback_prefix: Optional[str] = None) -> BotAction:
+        """Регистрация действия"""
+        if name in self.actions:
+            raise ValueError(f"Действие {name} уже зарегистрировано")
+        if label is not None and label in self.by_label:
+            raise ValueError(f"Кнопка «{label}» уже занята действием {self.by_label[label].name}")
+
+        action = BotAction(name, handler, command, label, row, description, callback_prefix)
+        self.actions[name] = action
+        if label is not None:
+            self.by_label[label] = action
+        self.latency[name] = LatencyHistogram()
+        self.errors[name] = 0
+        return action
+
+    async def run(self, action: BotAction, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Вызов обработчика с замером времени"""
+        start = time.perf_counter()
+        try:
+            return await action.handler(update, context)
+        except Exception:
+            self.errors[action.name] += 1
+            raise
+        finally:
+            self.latency[action.name].observe(time.perf_counter() - start)
+
+    def _command_callback(self, action: BotAction) -> Handler:
+        async def callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            return await self.run(action, update, context)
+        return callback
+
+    def command_handlers(self) -> List[CommandHandler]:
+        """CommandHandler для всех действий с командой"""
+        return [
+            CommandHandler(action.command, self._command_callback(action))
+            for action in self.actions.values() if action.command
+        ]
+
+    def callback_handlers(self) -> List[CallbackQueryHandler]:
+        """CallbackQueryHandler для действий с inline-кнопками"""
+        return [
+            CallbackQueryHandler(self._command_callback(action), pattern=f"^{re.escape(action.callback_prefix)}")
+            for action in self.actions.values() if action.callback_prefix
+        ]
+
+    def command_list(self) -> str:
+        """Строки «/команда - описание» для справки"""
+        return "\n".join(
+            f"/{action.command} - {action.description}"
+            for action in self.actions.values() if action.command and action.description
+        )
+
+    def button_list(self) -> str:
+        """Кнопки меню списком для справки"""
+        return "\n".join(f"• {action.label}" for action in self.actions.values() if action.label)
+
+    def keyboard(self) -> ReplyKeyboardMarkup:
+        """Клавиатура меню: кнопки по строкам в порядке регистрации"""
+        rows: Dict[int, List[KeyboardButton]] = {}
+        for action in self.actions.values():
+            if action.label is not None:
+                rows.setdefault(action.row or 0, []).append(KeyboardButton(action.label))
+        return ReplyKeyboardMarkup([rows[row] for row in sorted(rows)], resize_keyboard=True)
+
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка нажатия кнопки меню (текстового сообщения)"""
+        action = self.by_label.get(update.message.text)
+        if action is not None:
+            return await self.run(action, update, context)
+        if self.fallback is not None:
+            return await self.fallback(update, context)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Задержки и ошибки по действиям"""
+        return {
+            name: {**self.latency[name].as_dict(), "errors": self.errors[name]}
+            for name in self.actions
+        }
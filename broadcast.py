@@ -0,0 +1,216 @@
+"""
+Рассылка отчетов подписчикам через Telegram Bot API
+с учетом лимитов Telegram (~30 сообщений/с всего и 1 сообщение/с в чат)
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from report_store import ReportArtifact, ReportArtifactStore
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+
+class TokenBucket:
+    """Ограничитель скорости «корзина токенов»"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def pause(self, seconds: float):
+        """Остановка выдачи токенов (например, после ответа 429)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        """Ожидание одного токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramAPIError(Exception):
+    """Ошибка Bot API"""
+
+    def __init__(self, status: int, description: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status}: {description}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+@dataclass
+class BroadcastResult:
+    """Итоги рассылки"""
+    chats: int = 0
+    sent: int = 0
+    failed_chats: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+
+class BroadcastEngine:
+    """
+    Рассылка сообщений множеству чатов
+    Общая скорость ограничена корзиной токенов, чаты обрабатываются
+    пулом из workers задач, части отчета в один чат уходят по порядку
+    с интервалом per_chat_interval. Ответ 429 приостанавливает всю
+    рассылку на retry_after секунд. Записи о доставке (ссылка на отчет
+    по хэшу) пишутся в sent_reports пакетами через Database.save_sent_reports_bulk
+    """
+
+    def __init__(self, token: str, db=None, api_base: str = TELEGRAM_API_BASE,
+                 global_rate: float = 30.0, per_chat_interval: float = 1.0,
+                 workers: int = 20, max_retries: int = 3, record_batch_size: int = 500,
+                 session: Optional[aiohttp.ClientSession] = None):
+        self.url = f"{api_base}/bot{token}/sendMessage"
+        self.db = db
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self.record_batch_size = record_batch_size
+        self.session = session
+
+    async def _send_message(self, session: aiohttp.ClientSession, chat_id: int, text: str):
+        """Один вызов sendMessage"""
+        async with session.post(self.url, json={"chat_id": chat_id, "text": text}) as response:
+            data = await response.json(content_type=None)
+            if not data.get("ok"):
+                retry_after = (data.get("parameters") or {}).get("retry_after")
+                raise TelegramAPIError(response.status, data.get("description", ""), retry_after)
+
+    async def _send_with_retry(self, session: aiohttp.ClientSession, chat_id: int, text: str,
+                               result: BroadcastResult):
+        """Отправка с повторами после 429 и сетевых ошибок"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                await self._send_message(session, chat_id, text)
+                return
+            except TelegramAPIError as e:
+                # 400/403 - чат недоступен или бот заблокирован, повтор не поможет
+                if e.retry_after is None and e.status < 500:
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                if e.retry_after is not None:
+                    logger.warning(f"Лимит Telegram, пауза {e.retry_after} с")
+                    self.bucket.pause(e.retry_after)
+            except aiohttp.ClientError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+            result.retries += 1
+
+    async def _flush_records(self, records: List[Tuple[int, str, str]]):
+        """Пакетная запись доставленных отчетов"""
+        if not records:
+            return
+        batch = records[:]
+        records.clear()
+        if self.db is not None:
+            await self.db.save_sent_reports_bulk(batch)
+
+    async def _worker(self, session: aiohttp.ClientSession, queue: asyncio.Queue,
+                      artifact: ReportArtifact, result: BroadcastResult,
+                      records: List[Tuple[int, str, str]]):
+        """Обработчик очереди чатов"""
+        while True:
+            chat_id = await queue.get()
+            delivered = 0
+            try:
+                for i, text in enumerate(artifact.parts):
+                    if i:
+                        await asyncio.sleep(self.per_chat_interval)
+                    await self._send_with_retry(session, chat_id, text, result)
+                    result.sent += 1
+                    delivered += 1
+            except Exception as e:
+                result.failed_chats += 1
+                logger.error(f"Не удалось отправить отчет в чат {chat_id} "
+                             f"(доставлено частей: {delivered}): {e}")
+
+            try:
+                # Чат, получивший хотя бы часть отчета, тоже записывается
+                if delivered:
+                    records.append((chat_id, artifact.report_type, artifact.content_hash))
+                if len(records) >= self.record_batch_size:
+                    await self._flush_records(records)
+            finally:
+                queue.task_done()
+
+    async def broadcast(self, chat_ids: Iterable[int], artifact: ReportArtifact) -> BroadcastResult:
+        """Рассылка готового отчета (всех его частей) во все чаты"""
+        result = BroadcastResult()
+        # Записи о доставке - свои у каждой рассылки
+        records: List[Tuple[int, str, str]] = []
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+            result.chats += 1
+
+        session = self.session or aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.workers)
+        )
+        start = time.perf_counter()
+        workers = [
+            asyncio.create_task(self._worker(session, queue, artifact, result, records))
+            for _ in range(min(self.workers, result.chats))
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.session is None:
+                await session.close()
+            await self._flush_records(records)
+
+        result.elapsed = time.perf_counter() - start
+        logger.info(
+            f"Рассылка завершена: {result.sent} сообщений в {result.chats} чатов, "
+            f"ошибок {result.failed_chats}, {result.messages_per_second:.1f} сообщений/с"
+        )
+        return result
+
+
+async def broadcast_to_subscribers(engine: BroadcastEngine, db, store: ReportArtifactStore,
+                                   report_type: str, moment: datetime,
+                                   render: Callable[[], Iterable[str]]) -> BroadcastResult:
+    """
+    Рассылка отчета всем подписчикам из bot_users
+    Отчет формируется и сохраняется один раз на (тип, час) через store
+    """
+    artifact = await store.get_or_render(report_type, moment, render)
+    users = await db.get_active_users()
+    return await engine.broadcast((user.chat_id for user in users), artifact)
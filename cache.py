@@ -0,0 +1,97 @@
+"""
+Асинхронный TTL-кэш с объединением одновременных запросов
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTTLCache:
+    """
+    Кэш результатов асинхронных загрузчиков со сроком жизни записей
+    Одновременные промахи по одному ключу ждут один общий вызов загрузчика
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          ttl: Optional[float] = None) -> Any:
+        """Получение значения из кэша или загрузка через loader"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        # Загрузка по этому ключу уже идет - ждем ее результат
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # Загрузчик выполняется в отдельной задаче: отмена любого из
+            # ожидающих (в том числе первого) не прерывает загрузку для остальных
+            task = asyncio.create_task(self._load(key, loader, self.ttl if ttl is None else ttl))
+            task.add_done_callback(self._retrieve_exception)
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+            # Инвалидация во время загрузки делает результат устаревшим
+            if self._in_flight.get(key) is task:
+                self._store(key, value, ttl)
+            return value
+        finally:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+
+    @staticmethod
+    def _retrieve_exception(task: asyncio.Task):
+        # Исключение получают ожидающие; если их не осталось, не логируем его
+        # как «never retrieved»
+        if not task.cancelled():
+            task.exception()
+
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        """Сохранение значения с вытеснением самой старой записи"""
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Сброс одной записи или всего кэша"""
+        self.invalidations += 1
+        if key is None:
+            self._entries.clear()
+            self._in_flight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._in_flight.pop(key, None)
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Метрики попаданий и промахов"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0
+        }
@@ -0,0 +1,178 @@
+"""
+Журнал состояния сборщика статистики на диске
+Заказы по часам за текущий день и цены переживают перезапуск процесса
+"""
+import logging
+import os
+import struct
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OZST1\n"
+
+# Запись журнала: тип (1 байт) и длина данных
+_RECORD = struct.Struct("<cI")
+# Данные записей
+_HOUR = struct.Struct("<iBI")      # день (ordinal), час, число товаров
+_SNAPSHOT = struct.Struct("<iI")   # день (ordinal), число товаров
+
+CATALOG = b"C"   # порядок артикулов для следующих записей
+HOUR = b"H"      # заказы за один сбор (прибавляются) и цены
+SNAPSHOT = b"S"  # полное состояние дня: заказы по 24 часам и цены
+
+
+@dataclass
+class CollectorSnapshot:
+    """Состояние сборщика за день"""
+    day: date
+    codes: List[str]
+    hourly: array  # array('i') размером len(codes) * 24, строка - артикул
+    prices: array  # array('d')
+
+    def counts_for(self, i: int) -> array:
+        return self.hourly[i * 24:(i + 1) * 24]
+
+
+class CollectorStateLog:
+    """
+    Журнал только для добавления
+    После каждого сбора дописывается одна запись с заказами и ценами
+    в порядке последнего каталога. Раз в compact_every записей и при смене
+    дня журнал переписывается одним снимком (через временный файл)
+    """
+
+    def __init__(self, path: str, compact_every: int = 96):
+        self.path = path
+        self.compact_every = compact_every
+        self.day: Optional[date] = None
+        self.records = 0
+        self._codes: Optional[List[str]] = None
+
+    # Чтение
+    def load(self) -> Optional[CollectorSnapshot]:
+        """Восстановление последнего состояния из журнала (None - журнала нет)"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if not data.startswith(MAGIC):
+            logger.warning(f"{self.path}: неизвестный формат журнала, состояние не восстановлено")
+            return None
+
+        snapshot: Optional[CollectorSnapshot] = None
+        codes: List[str] = []
+        offset = len(MAGIC)
+        records = 0
+        while offset + _RECORD.size <= len(data):
+            kind, length = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            if start + length > len(data):
+                break
+            payload = memoryview(data)[start:start + length]
+            offset = start + length
+            records += 1
+
+            if kind == CATALOG:
+                codes = bytes(payload).decode("utf-8").split("\n") if length else []
+            elif kind == SNAPSHOT:
+                day, size = _SNAPSHOT.unpack_from(payload)
+                hourly = array("i")
+                hourly.frombytes(payload[_SNAPSHOT.size:_SNAPSHOT.size + size * 24 * hourly.itemsize])
+                prices = array("d")
+                prices.frombytes(payload[_SNAPSHOT.size + size * 24 * hourly.itemsize:])
+                snapshot = CollectorSnapshot(date.fromordinal(day), list(codes), hourly, prices)
+            elif kind == HOUR:
+                day, hour, size = _HOUR.unpack_from(payload)
+                counts = array("i")
+                counts.frombytes(payload[_HOUR.size:_HOUR.size + size * counts.itemsize])
+                prices = array("d")
+                prices.frombytes(payload[_HOUR.size + size * counts.itemsize:])
+                snapshot = self._apply_hour(snapshot, date.fromordinal(day), hour, codes, counts, prices)
+
+        if offset != len(data):
+            # Хвост недописанной записи (сбой во время записи) отбрасываем
+            logger.warning(f"{self.path}: отброшено {len(data) - offset} байт незавершенной записи")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+        self.records = records
+        self._codes = codes
+        if snapshot is not None:
+            self.day = snapshot.day
+        return snapshot
+
+    @staticmethod
+    def _apply_hour(snapshot: Optional[CollectorSnapshot], day: date, hour: int, codes: List[str],
+                    counts: array, prices: array) -> CollectorSnapshot:
+        if snapshot is None or snapshot.day != day or snapshot.codes != codes:
+            # Новый день или каталог: переносим заказы по артикулам, если день тот же
+            previous = snapshot
+            snapshot = CollectorSnapshot(day, list(codes), array("i", [0]) * (len(codes) * 24), prices)
+            if previous is not None and previous.day == day:
+                index = {code: i for i, code in enumerate(previous.codes)}
+                for i, code in enumerate(codes):
+                    j = index.get(code)
+                    if j is not None:
+                        snapshot.hourly[i * 24:(i + 1) * 24] = previous.counts_for(j)
+
+        for i, count in enumerate(counts):
+            snapshot.hourly[i * 24 + hour] += count
+        snapshot.prices = prices
+        return snapshot
+
+    # Запись
+    def _write_record(self, f, kind: bytes, payload: bytes):
+        f.write(_RECORD.pack(kind, len(payload)))
+        f.write(payload)
+        self.records += 1
+
+    def append_hour(self, day: date, hour: int, codes: Sequence[str], counts: Sequence[int],
+                    prices: Sequence[float]):
+        """Запись результатов одного сбора"""
+        if self.day is not None and day != self.day:
+            # Новый день: прошлые заказы больше не нужны
+            self.compact(day, codes, array("i", [0]) * (len(codes) * 24), prices)
+
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "ab") as f:
+            if new_file:
+                f.write(MAGIC)
+                self.records = 0
+                self._codes = None
+            if self._codes != list(codes):
+                self._codes = list(codes)
+                self._write_record(f, CATALOG, "\n".join(codes).encode("utf-8"))
+            self._write_record(
+                f, HOUR,
+                _HOUR.pack(day.toordinal(), hour, len(codes))
+                + array("i", counts).tobytes() + array("d", prices).tobytes()
+            )
+        self.day = day
+
+    def compact(self, day: date, codes: Sequence[str], hourly: array, prices: Sequence[float]):
+        """Замена журнала одним снимком состояния"""
+        tmp_path = f"{self.path}.tmp"
+        self.records = 0
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            self._write_record(f, CATALOG, "\n".join(codes).encode("utf-8"))
+            self._write_record(
+                f, SNAPSHOT,
+                _SNAPSHOT.pack(day.toordinal(), len(codes))
+                + array("i", hourly).tobytes() + array("d", prices).tobytes()
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._codes = list(codes)
+        self.day = day
+        logger.info(f"Журнал состояния сжат: {len(codes)} товаров")
+
+    def needs_compaction(self) -> bool:
+        return self.records >= self.compact_every
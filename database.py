@@ -1,15 +1,24 @@
 """
 Модуль для работы с PostgreSQL
 """
+import asyncio
 import asyncpg
+import asyncpg.prepared_stmt
 import logging
+import time
 from datetime import datetime, date
-from typing import List, Dict, Optional
+from collections import deque
+from itertools import islice
+from typing import List, Dict, Optional, Iterable, Tuple, Callable
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
 
+class OrderDataError(Exception):
+    """Пакет заказов отклонен БД из-за данных (неизвестный артикул, некорректные значения)"""
+
+
 @dataclass
 class Article:
     """Модель товара"""
@@ -51,16 +60,280 @@ class BotUser:
     last_active: datetime
 
 
+# Таблица готовых отчетов: sent_reports ссылается на отчет по хэшу
+# вместо копии текста для каждого получателя
+REPORT_ARTIFACTS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS report_artifacts (
+        content_hash CHAR(64) PRIMARY KEY,
+        report_type VARCHAR(50) NOT NULL,
+        report_hour TIMESTAMP NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    ALTER TABLE sent_reports
+        ADD COLUMN IF NOT EXISTS content_hash CHAR(64) REFERENCES report_artifacts(content_hash);
+"""
+
+
+# Аренда лидерства для планировщика: token растет при каждой смене
+# держателя и служит маркером (fencing token) для запусков задач
+LEADER_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS scheduler_leases (
+        name VARCHAR(100) PRIMARY KEY,
+        holder VARCHAR(200) NOT NULL,
+        token BIGINT NOT NULL DEFAULT 1,
+        expires_at TIMESTAMPTZ NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS scheduler_runs (
+        job_name VARCHAR(100) NOT NULL,
+        slot TIMESTAMPTZ NOT NULL,
+        holder VARCHAR(200) NOT NULL,
+        token BIGINT NOT NULL,
+        claimed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (job_name, slot)
+    );
+"""
+
+
+# Реестр SQL-запросов. Каждый запрос подготавливается один раз
+# на соединение при первом использовании (см. Database._run_query)
+QUERIES: Dict[str, str] = {
+    "save_article": """
+        INSERT INTO articles (article_code, article_name, current_price)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (article_code) 
+        DO UPDATE SET 
+            article_name = EXCLUDED.article_name,
+            current_price = EXCLUDED.current_price,
+            updated_at = CURRENT_TIMESTAMP
+    """,
+    "get_all_articles": """
+        SELECT article_code, article_name, current_price, 
+               created_at, updated_at 
+        FROM articles 
+        ORDER BY article_code
+    """,
+    # Keyset-пагинация по первичному ключу: каждая страница - один
+    # проход по диапазону индекса, без OFFSET
+    "get_articles_page_after": """
+        SELECT article_code, article_name, current_price,
+               created_at, updated_at
+        FROM articles
+        WHERE article_code > $1
+        ORDER BY article_code
+        LIMIT $2
+    """,
+    "get_articles_page_before": """
+        SELECT article_code, article_name, current_price,
+               created_at, updated_at
+        FROM articles
+        WHERE article_code < $1
+        ORDER BY article_code DESC
+        LIMIT $2
+    """,
+    # Без условия на NULL в запросе план использует индекс idx_articles_updated_at
+    "get_articles_updated_after": """
+        SELECT article_code, article_name, current_price,
+               created_at, updated_at
+        FROM articles
+        WHERE updated_at > $1
+        ORDER BY updated_at
+    """,
+    "save_order": """
+        WITH new_order AS (
+            INSERT INTO orders (article_code, order_time, hour_of_day)
+            VALUES ($1, $2, $3)
+            RETURNING article_code
+        )
+        INSERT INTO daily_stats (article_code, date, hour, orders_count)
+        SELECT article_code, $4::date, $3::int, 1 FROM new_order
+        ON CONFLICT (article_code, date, hour) 
+        DO UPDATE SET 
+            orders_count = daily_stats.orders_count + 1,
+            updated_at = CURRENT_TIMESTAMP
+    """,
+    "save_orders_rollup": """
+        INSERT INTO daily_stats (article_code, date, hour, orders_count)
+        SELECT o.article_code, o.order_time::date, o.hour_of_day, COUNT(*)
+        FROM unnest($1::varchar[], $2::timestamp[], $3::int[])
+             AS o(article_code, order_time, hour_of_day)
+        GROUP BY o.article_code, o.order_time::date, o.hour_of_day
+        ON CONFLICT (article_code, date, hour) 
+        DO UPDATE SET 
+            orders_count = daily_stats.orders_count + EXCLUDED.orders_count,
+            updated_at = CURRENT_TIMESTAMP
+    """,
+    "update_daily_stats": """
+        INSERT INTO daily_stats (article_code, date, hour, orders_count)
+        VALUES ($1, $2, $3, 1)
+        ON CONFLICT (article_code, date, hour) 
+        DO UPDATE SET 
+            orders_count = daily_stats.orders_count + 1,
+            updated_at = CURRENT_TIMESTAMP
+    """,
+    "get_hourly_stats": """
+        SELECT ds.article_code, ds.date, ds.hour, ds.orders_count,
+               a.article_name, a.current_price
+        FROM daily_stats ds
+        JOIN articles a ON ds.article_code = a.article_code
+        WHERE ds.date = $1 AND ds.hour = $2
+        ORDER BY ds.orders_count DESC
+    """,
+    "get_recent_orders": """
+        SELECT ds.article_code, a.article_name, ds.orders_count,
+               a.current_price, ds.hour
+        FROM daily_stats ds
+        JOIN articles a ON ds.article_code = a.article_code
+        WHERE ds.date = $1 AND ds.orders_count > 0
+        ORDER BY ds.hour DESC, ds.orders_count DESC
+        LIMIT $2
+    """,
+    "get_daily_total": """
+        SELECT article_code, SUM(orders_count) as total_orders
+        FROM daily_stats
+        WHERE date = $1
+        GROUP BY article_code
+        ORDER BY total_orders DESC
+    """,
+    "save_user": """
+        INSERT INTO bot_users (chat_id, username, first_name, last_name)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (chat_id) 
+        DO UPDATE SET 
+            username = EXCLUDED.username,
+            first_name = EXCLUDED.first_name,
+            last_name = EXCLUDED.last_name,
+            last_active = CURRENT_TIMESTAMP,
+            is_active = TRUE
+    """,
+    "get_active_users": """
+        SELECT chat_id, username, first_name, last_name,
+               is_active, subscribed_to_daily, subscribed_to_alerts,
+               created_at, last_active
+        FROM bot_users
+        WHERE is_active = TRUE AND subscribed_to_daily = TRUE
+        ORDER BY chat_id
+    """,
+    "update_user_subscription_daily": """
+        UPDATE bot_users 
+        SET subscribed_to_daily = $2,
+            last_active = CURRENT_TIMESTAMP
+        WHERE chat_id = $1
+    """,
+    "update_user_subscription_alerts": """
+        UPDATE bot_users 
+        SET subscribed_to_alerts = $2,
+            last_active = CURRENT_TIMESTAMP
+        WHERE chat_id = $1
+    """,
+    "touch_users_activity": """
+        UPDATE bot_users AS u
+        SET last_active = GREATEST(u.last_active, v.last_active)
+        FROM unnest($1::bigint[], $2::timestamp[]) AS v(chat_id, last_active)
+        WHERE u.chat_id = v.chat_id
+    """,
+    "get_dashboard_counters": """
+        WITH today AS (
+            SELECT COALESCE(SUM(ds.orders_count), 0) AS orders,
+                   COALESCE(SUM(ds.orders_count * a.current_price), 0) AS revenue
+            FROM daily_stats ds
+            LEFT JOIN articles a ON ds.article_code = a.article_code
+            WHERE ds.date = $1
+        ), users AS (
+            SELECT COUNT(*) FILTER (WHERE is_active) AS active_users,
+                   COUNT(*) FILTER (WHERE is_active AND subscribed_to_daily) AS subscribers
+            FROM bot_users
+        )
+        SELECT today.orders AS today_orders,
+               today.revenue AS today_revenue,
+               users.active_users,
+               users.subscribers,
+               (SELECT COUNT(*) FROM articles) AS total_products
+        FROM today, users
+    """,
+    "save_report_artifact": """
+        INSERT INTO report_artifacts (content_hash, report_type, report_hour, content)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (content_hash) DO NOTHING
+    """,
+    "acquire_lease": """
+        INSERT INTO scheduler_leases (name, holder, expires_at)
+        VALUES ($1, $2, now() + make_interval(secs => $3::float8))
+        ON CONFLICT (name) DO UPDATE
+        SET holder = EXCLUDED.holder,
+            expires_at = EXCLUDED.expires_at,
+            token = CASE WHEN scheduler_leases.holder = EXCLUDED.holder
+                         THEN scheduler_leases.token
+                         ELSE scheduler_leases.token + 1 END
+        WHERE scheduler_leases.holder = EXCLUDED.holder
+           OR scheduler_leases.expires_at < now()
+        RETURNING token
+    """,
+    "release_lease": """
+        UPDATE scheduler_leases SET expires_at = now()
+        WHERE name = $1 AND holder = $2
+    """,
+    "claim_scheduled_run": """
+        INSERT INTO scheduler_runs (job_name, slot, holder, token)
+        SELECT $4, $5, $2, $3
+        WHERE EXISTS (
+            SELECT 1 FROM scheduler_leases
+            WHERE name = $1 AND holder = $2 AND token = $3 AND expires_at > now()
+        )
+        ON CONFLICT (job_name, slot) DO NOTHING
+        RETURNING token
+    """,
+    "save_sent_report": """
+        INSERT INTO sent_reports (chat_id, report_type, report_content)
+        VALUES ($1, $2, $3)
+    """
+}
+
+
+@dataclass
+class QueryStat:
+    """Статистика выполнения запроса"""
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": self.total_time / self.calls * 1000 if self.calls else 0,
+            "max_ms": self.max_time * 1000,
+            "total_ms": self.total_time * 1000
+        }
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Соединение с подготовленными запросами из QUERIES"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements: Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
+
 class Database:
     """Класс для работы с базой данных"""
 
-    def __init__(self, host: str, port: int, database: str, user: str, password: str):
+    def __init__(self, host: str, port: int, database: str, user: str, password: str,
+                 min_pool_size: int = 1, max_pool_size: int = 10):
         self.host = host
         self.port = port
         self.database = database
         self.user = user
         self.password = password
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
         self.pool: Optional[asyncpg.Pool] = None
+        self.order_buffer: Optional["OrderBuffer"] = None
+        self.activity_tracker: Optional["ActivityTracker"] = None
+        self.query_stats: Dict[str, QueryStat] = {name: QueryStat() for name in QUERIES}
+        # Подписчики на запись новых заказов (например, сброс кэша дашборда)
+        self.order_listeners: List[Callable[[], None]] = []
 
     async def connect(self):
         """Подключение к базе данных"""
@@ -71,8 +344,9 @@ class Database:
                 database=self.database,
                 user=self.user,
                 password=self.password,
-                min_size=1,
-                max_size=10
+                min_size=self.min_pool_size,
+                max_size=self.max_pool_size,
+                connection_class=PreparedConnection
             )
             logger.info(f"Подключено к базе данных {self.database}")
 
@@ -85,26 +359,99 @@ class Database:
             logger.error(f"Ошибка подключения к БД: {e}")
             return False
 
+    @staticmethod
+    async def _statement(conn: PreparedConnection, name: str) -> asyncpg.prepared_stmt.PreparedStatement:
+        """
+        Подготовленный запрос соединения; готовится при первом вызове
+        Неудачная подготовка (например, таблицы еще нет) не запоминается
+        и повторяется при следующем вызове
+        """
+        statement = conn.statements.get(name)
+        if statement is None:
+            statement = conn.statements[name] = await conn.prepare(QUERIES[name])
+        return statement
+
+    async def _run_query(self, conn, name: str, method: str, *args):
+        """Выполнение подготовленного запроса из реестра с замером времени"""
+        stat = self.query_stats[name]
+        start = time.perf_counter()
+        try:
+            statement = await self._statement(conn, name)
+            try:
+                return await getattr(statement, method)(*args)
+            except asyncpg.exceptions.InvalidCachedStatementError:
+                # Схема таблицы изменилась после подготовки - готовим заново
+                conn.statements.pop(name, None)
+                statement = await self._statement(conn, name)
+                return await getattr(statement, method)(*args)
+        except Exception:
+            stat.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stat.calls += 1
+            stat.total_time += elapsed
+            stat.max_time = max(stat.max_time, elapsed)
+
+    def _notify_order_listeners(self):
+        """Уведомление подписчиков о новых заказах"""
+        for listener in self.order_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика новых заказов: {e}")
+
+    def get_query_stats(self) -> Dict[str, Dict[str, float]]:
+        """Статистика времени выполнения по запросам"""
+        return {name: stat.as_dict() for name, stat in self.query_stats.items() if stat.calls}
+
     async def close(self):
         """Закрытие соединения"""
+        if self.order_buffer:
+            # Сбрасываем накопленные заказы до закрытия пула
+            await self.order_buffer.close()
+            self.order_buffer = None
+
+        if self.activity_tracker:
+            await self.activity_tracker.close()
+            self.activity_tracker = None
+
         if self.pool:
             await self.pool.close()
             logger.info("Соединение с БД закрыто")
 
+    def enable_order_buffer(self, flush_interval_ms: int = 500, max_batch_size: int = 1000,
+                            max_pending: int = 10000) -> "OrderBuffer":
+        """Включение отложенной записи заказов через OrderBuffer"""
+        if self.order_buffer is None:
+            self.order_buffer = OrderBuffer(
+                self,
+                flush_interval_ms=flush_interval_ms,
+                max_batch_size=max_batch_size,
+                max_pending=max_pending
+            )
+            self.order_buffer.start()
+        return self.order_buffer
+
+    def enable_activity_tracker(self, flush_interval_ms: int = 5000, max_batch_size: int = 5000,
+                                max_pending: int = 50000) -> "ActivityTracker":
+        """Включение пакетного обновления last_active через ActivityTracker"""
+        if self.activity_tracker is None:
+            self.activity_tracker = ActivityTracker(
+                self,
+                flush_interval_ms=flush_interval_ms,
+                max_batch_size=max_batch_size,
+                max_pending=max_pending
+            )
+            self.activity_tracker.start()
+        return self.activity_tracker
+
     # Методы для работы с товарами
     async def save_article(self, article_code: str, article_name: str, price: float) -> bool:
         """Сохранение товара в БД"""
         try:
             async with self.pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO articles (article_code, article_name, current_price)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (article_code) 
-                    DO UPDATE SET 
-                        article_name = EXCLUDED.article_name,
-                        current_price = EXCLUDED.current_price,
-                        updated_at = CURRENT_TIMESTAMP
-                """, article_code, article_name, price)
+                await self._run_query(conn, "save_article", "fetch", article_code, article_name, price)
                 return True
         except Exception as e:
             logger.error(f"Ошибка сохранения товара: {e}")
@@ -114,12 +461,7 @@ class Database:
         """Получение всех товаров"""
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT article_code, article_name, current_price, 
-                           created_at, updated_at 
-                    FROM articles 
-                    ORDER BY article_code
-                """)
+                rows = await self._run_query(conn, "get_all_articles", "fetch")
 
                 return [
                     Article(
@@ -134,42 +476,127 @@ class Database:
             logger.error(f"Ошибка получения товаров: {e}")
             return []
 
+    async def get_articles_page(self, after: Optional[str] = None, before: Optional[str] = None,
+                                limit: int = 10) -> Tuple[List[Article], bool]:
+        """
+        Страница товаров в порядке article_code
+        after - товары после артикула (None - с начала), before - товары перед
+        артикулом. Возвращает (товары, есть ли еще товары в направлении перехода)
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                if before is not None:
+                    rows = await self._run_query(conn, "get_articles_page_before", "fetch", before, limit + 1)
+                else:
+                    rows = await self._run_query(conn, "get_articles_page_after", "fetch", after or "", limit + 1)
+
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                if before is not None:
+                    rows.reverse()
+
+                return [
+                    Article(
+                        article_code=row['article_code'],
+                        article_name=row['article_name'],
+                        current_price=row['current_price'],
+                        created_at=row['created_at'],
+                        updated_at=row['updated_at']
+                    ) for row in rows
+                ], has_more
+        except Exception as e:
+            logger.error(f"Ошибка получения страницы товаров: {e}")
+            return [], False
+
+    async def get_articles_updated_since(self, since: Optional[datetime]) -> List[Article]:
+        """Товары, измененные после since (все товары, если since не задан)"""
+        try:
+            async with self.pool.acquire() as conn:
+                if since is None:
+                    rows = await self._run_query(conn, "get_all_articles", "fetch")
+                else:
+                    rows = await self._run_query(conn, "get_articles_updated_after", "fetch", since)
+
+                return [
+                    Article(
+                        article_code=row['article_code'],
+                        article_name=row['article_name'],
+                        current_price=row['current_price'],
+                        created_at=row['created_at'],
+                        updated_at=row['updated_at']
+                    ) for row in rows
+                ]
+        except Exception as e:
+            logger.error(f"Ошибка получения измененных товаров: {e}")
+            return []
+
     # Методы для работы с заказами
     async def save_order(self, article_code: str, order_time: datetime) -> bool:
         """Сохранение заказа"""
+        if self.order_buffer is not None:
+            await self.order_buffer.add(article_code, order_time)
+            return True
+
         try:
             async with self.pool.acquire() as conn:
-                hour_of_day = order_time.hour
-
-                await conn.execute("""
-                    INSERT INTO orders (article_code, order_time, hour_of_day)
-                    VALUES ($1, $2, $3)
-                """, article_code, order_time, hour_of_day)
-
-                # Обновляем дневную статистику
-                await self.update_daily_stats(
-                    article_code=article_code,
-                    stat_date=order_time.date(),
-                    hour=hour_of_day
-                )
+                # Заказ и счетчик дневной статистики пишутся одним запросом
+                # на одном соединении, без второго обращения к пулу
+                await self._run_query(conn, "save_order", "fetch",
+                                      article_code, order_time, order_time.hour, order_time.date())
 
-                return True
+            self._notify_order_listeners()
+            return True
         except Exception as e:
             logger.error(f"Ошибка сохранения заказа: {e}")
             return False
 
+    async def save_orders_bulk(self, orders: Iterable[Tuple[str, datetime]],
+                               raise_data_errors: bool = False) -> int:
+        """
+        Пакетное сохранение заказов
+        Заказы загружаются в orders через COPY, а daily_stats обновляется
+        одним сгруппированным запросом в той же транзакции.
+        raise_data_errors - ошибку из-за данных пакета (нарушение ограничений,
+        некорректные значения) передать как OrderDataError вместо возврата 0;
+        0 тогда означает сбой соединения или БД, после которого пакет можно повторить
+        """
+        records = [(article_code, order_time, order_time.hour) for article_code, order_time in orders]
+        if not records:
+            return 0
+
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.copy_records_to_table(
+                        "orders",
+                        records=records,
+                        columns=["article_code", "order_time", "hour_of_day"]
+                    )
+
+                    await self._run_query(
+                        conn, "save_orders_rollup", "fetch",
+                        [r[0] for r in records],
+                        [r[1] for r in records],
+                        [r[2] for r in records]
+                    )
+
+            self._notify_order_listeners()
+            return len(records)
+        except (asyncpg.exceptions.DataError, asyncpg.exceptions.IntegrityConstraintViolationError) as e:
+            if raise_data_errors:
+                raise OrderDataError(str(e)) from e
+            logger.error(f"Ошибка пакетного сохранения заказов: {e}")
+            return 0
+        except Exception as e:
+            logger.error(f"Ошибка пакетного сохранения заказов: {e}")
+            return 0
+
     async def update_daily_stats(self, article_code: str, stat_date: date, hour: int):
         """Обновление дневной статистики"""
         try:
             async with self.pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO daily_stats (article_code, date, hour, orders_count)
-                    VALUES ($1, $2, $3, 1)
-                    ON CONFLICT (article_code, date, hour) 
-                    DO UPDATE SET 
-                        orders_count = daily_stats.orders_count + 1,
-                        updated_at = CURRENT_TIMESTAMP
-                """, article_code, stat_date, hour)
+                await self._run_query(conn, "update_daily_stats", "fetch",
+                                      article_code, stat_date, hour)
         except Exception as e:
             logger.error(f"Ошибка обновления статистики: {e}")
 
@@ -177,14 +604,8 @@ class Database:
         """Получение статистики за конкретный час"""
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT ds.article_code, ds.date, ds.hour, ds.orders_count,
-                           a.article_name, a.current_price
-                    FROM daily_stats ds
-                    JOIN articles a ON ds.article_code = a.article_code
-                    WHERE ds.date = $1 AND ds.hour = $2
-                    ORDER BY ds.orders_count DESC
-                """, target_date, target_hour)
+                rows = await self._run_query(conn, "get_hourly_stats", "fetch",
+                                             target_date, target_hour)
 
                 return [
                     DailyStat(
@@ -198,41 +619,68 @@ class Database:
             logger.error(f"Ошибка получения часовой статистики: {e}")
             return []
 
+    async def get_recent_orders(self, target_date: date, limit: int = 10) -> List[Dict]:
+        """Заказы по товарам за последние часы дня (сначала самые свежие)"""
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await self._run_query(conn, "get_recent_orders", "fetch", target_date, limit)
+
+                return [
+                    {
+                        "article_code": row['article_code'],
+                        "article_name": row['article_name'],
+                        "orders_count": row['orders_count'],
+                        "price": row['current_price'],
+                        "hour": row['hour']
+                    } for row in rows
+                ]
+        except Exception as e:
+            logger.error(f"Ошибка получения последних заказов: {e}")
+            return []
+
     async def get_daily_total(self, target_date: date) -> Dict[str, int]:
         """Получение общей статистики за день"""
         try:
             async with self.pool.acquire() as conn:
                 # Общее количество за день
-                rows = await conn.fetch("""
-                    SELECT article_code, SUM(orders_count) as total_orders
-                    FROM daily_stats
-                    WHERE date = $1
-                    GROUP BY article_code
-                    ORDER BY total_orders DESC
-                """, target_date)
+                rows = await self._run_query(conn, "get_daily_total", "fetch", target_date)
 
                 return {row['article_code']: row['total_orders'] for row in rows}
         except Exception as e:
             logger.error(f"Ошибка получения дневной статистики: {e}")
             return {}
 
+    async def get_dashboard_counters(self, target_date: date) -> Optional[Dict[str, float]]:
+        """
+        Счетчики для шапки дашборда одним запросом
+        Выручка считается по текущим ценам товаров
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                row = await self._run_query(conn, "get_dashboard_counters", "fetchrow", target_date)
+
+                today_orders = row['today_orders']
+                today_revenue = float(row['today_revenue'])
+                return {
+                    "today_orders": today_orders,
+                    "today_revenue": today_revenue,
+                    "avg_order_value": today_revenue / today_orders if today_orders else 0.0,
+                    "active_users": row['active_users'],
+                    "subscribers": row['subscribers'],
+                    "total_products": row['total_products']
+                }
+        except Exception as e:
+            logger.error(f"Ошибка получения счетчиков дашборда: {e}")
+            return None
+
     # Методы для работы с пользователями
     async def save_user(self, chat_id: int, username: Optional[str] = None,
                         first_name: Optional[str] = None, last_name: Optional[str] = None) -> bool:
         """Сохранение/обновление пользователя"""
         try:
             async with self.pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO bot_users (chat_id, username, first_name, last_name)
-                    VALUES ($1, $2, $3, $4)
-                    ON CONFLICT (chat_id) 
-                    DO UPDATE SET 
-                        username = EXCLUDED.username,
-                        first_name = EXCLUDED.first_name,
-                        last_name = EXCLUDED.last_name,
-                        last_active = CURRENT_TIMESTAMP,
-                        is_active = TRUE
-                """, chat_id, username, first_name, last_name)
+                await self._run_query(conn, "save_user", "fetch",
+                                      chat_id, username, first_name, last_name)
                 return True
         except Exception as e:
             logger.error(f"Ошибка сохранения пользователя: {e}")
@@ -242,14 +690,7 @@ class Database:
         """Получение активных пользователей"""
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT chat_id, username, first_name, last_name,
-                           is_active, subscribed_to_daily, subscribed_to_alerts,
-                           created_at, last_active
-                    FROM bot_users
-                    WHERE is_active = TRUE AND subscribed_to_daily = TRUE
-                    ORDER BY chat_id
-                """)
+                rows = await self._run_query(conn, "get_active_users", "fetch")
 
                 return [
                     BotUser(
@@ -273,32 +714,402 @@ class Database:
         try:
             async with self.pool.acquire() as conn:
                 if subscription_type == 'daily':
-                    await conn.execute("""
-                        UPDATE bot_users 
-                        SET subscribed_to_daily = $2,
-                            last_active = CURRENT_TIMESTAMP
-                        WHERE chat_id = $1
-                    """, chat_id, value)
+                    await self._run_query(conn, "update_user_subscription_daily", "fetch", chat_id, value)
                 elif subscription_type == 'alerts':
-                    await conn.execute("""
-                        UPDATE bot_users 
-                        SET subscribed_to_alerts = $2,
-                            last_active = CURRENT_TIMESTAMP
-                        WHERE chat_id = $1
-                    """, chat_id, value)
+                    await self._run_query(conn, "update_user_subscription_alerts", "fetch", chat_id, value)
 
                 return True
         except Exception as e:
             logger.error(f"Ошибка обновления подписки: {e}")
             return False
 
+    async def touch_users_bulk(self, activity: Iterable[Tuple[int, datetime]]) -> bool:
+        """Пакетное обновление last_active (chat_id, время) одним запросом"""
+        activity = list(activity)
+        if not activity:
+            return True
+
+        chat_ids, times = zip(*activity)
+        try:
+            async with self.pool.acquire() as conn:
+                await self._run_query(conn, "touch_users_activity", "fetch", list(chat_ids), list(times))
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка обновления активности пользователей: {e}")
+            return False
+
     async def save_sent_report(self, chat_id: int, report_type: str, report_content: str):
         """Сохранение отправленного отчета"""
         try:
             async with self.pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO sent_reports (chat_id, report_type, report_content)
-                    VALUES ($1, $2, $3)
-                """, chat_id, report_type, report_content)
+                await self._run_query(conn, "save_sent_report", "fetch", chat_id, report_type, report_content)
         except Exception as e:
             logger.error(f"Ошибка сохранения отчета: {e}")
+
+    async def ensure_report_artifacts_schema(self) -> bool:
+        """Создание таблицы report_artifacts и ссылки на нее в sent_reports"""
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute(REPORT_ARTIFACTS_SCHEMA)
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка создания таблицы отчетов: {e}")
+            return False
+
+    async def save_report_artifact(self, content_hash: str, report_type: str,
+                                   report_hour: datetime, content: str) -> bool:
+        """Сохранение готового отчета (повторное сохранение игнорируется)"""
+        try:
+            async with self.pool.acquire() as conn:
+                await self._run_query(conn, "save_report_artifact", "fetch",
+                                      content_hash, report_type, report_hour, content)
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения готового отчета: {e}")
+            return False
+
+    async def ensure_leader_schema(self) -> bool:
+        """Создание таблиц аренды лидерства и запусков задач"""
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute(LEADER_SCHEMA)
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка создания таблиц лидерства: {e}")
+            return False
+
+    async def acquire_lease(self, name: str, holder: str, ttl: float) -> Optional[int]:
+        """
+        Захват или продление аренды name на ttl секунд
+        Возвращает маркер аренды или None, если ей владеет другой экземпляр
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                return await self._run_query(conn, "acquire_lease", "fetchval", name, holder, ttl)
+        except Exception as e:
+            logger.error(f"Ошибка захвата аренды {name}: {e}")
+            return None
+
+    async def release_lease(self, name: str, holder: str) -> bool:
+        """Досрочное освобождение аренды (быстрая передача лидерства)"""
+        try:
+            async with self.pool.acquire() as conn:
+                await self._run_query(conn, "release_lease", "fetch", name, holder)
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка освобождения аренды {name}: {e}")
+            return False
+
+    async def claim_scheduled_run(self, lease_name: str, holder: str, token: int,
+                                  job_name: str, slot: datetime) -> bool:
+        """
+        Регистрация запуска задачи за слот slot
+        Успешна только для действующего держателя аренды с маркером token
+        и только один раз на слот
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                claimed = await self._run_query(conn, "claim_scheduled_run", "fetchval",
+                                                lease_name, holder, token, job_name, slot)
+                return claimed is not None
+        except Exception as e:
+            logger.error(f"Ошибка регистрации запуска {job_name}: {e}")
+            return False
+
+    async def save_sent_reports_bulk(self, records: Iterable[Tuple[int, str, str]]) -> int:
+        """Пакетное сохранение отправленных отчетов (chat_id, report_type, content_hash)"""
+        records = list(records)
+        if not records:
+            return 0
+
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.copy_records_to_table(
+                    "sent_reports",
+                    records=records,
+                    columns=["chat_id", "report_type", "content_hash"]
+                )
+                return len(records)
+        except Exception as e:
+            logger.error(f"Ошибка пакетного сохранения отчетов: {e}")
+            return 0
+
+
+class OrderBuffer:
+    """
+    Буфер отложенной записи заказов (write-behind)
+    Копит заказы в памяти и сбрасывает их в БД через save_orders_bulk
+    каждые flush_interval_ms миллисекунд или по достижении max_batch_size
+    заказов - что наступит раньше. Повторы (article_code, date, hour)
+    в пакете схлопываются в одно изменение daily_stats.
+    При сбое соединения пакет возвращается в очередь целиком. Пакет,
+    отклоненный из-за данных, делится пополам до отдельных заказов: заказы,
+    которые не пишутся и поодиночке (например, неизвестный артикул),
+    откладываются в dead_letter, остальные сохраняются.
+    """
+
+    def __init__(self, db: Database, flush_interval_ms: int = 500,
+                 max_batch_size: int = 1000, max_pending: int = 10000,
+                 dead_letter_size: int = 1000):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_pending = max(max_pending, max_batch_size)
+
+        self._pending: List[Tuple[str, datetime]] = []
+        self._flush_lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Заказы, отброшенные после разбора пакета (последние dead_letter_size)
+        self.dead_letter: deque = deque(maxlen=dead_letter_size)
+
+        # Счетчики
+        self.flush_count = 0
+        self.failed_flush_count = 0
+        self.dropped_orders = 0
+        self.orders_flushed = 0
+        self.last_batch_size = 0
+        self.max_batch_seen = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def start(self):
+        """Запуск фоновой задачи сброса"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, article_code: str, order_time: datetime):
+        """Добавление заказа в буфер"""
+        # Backpressure: при переполненном буфере ждем, пока данные уйдут в БД
+        while len(self._pending) >= self.max_pending:
+            if not await self.flush():
+                await asyncio.sleep(self.flush_interval)
+
+        self._pending.append((article_code, order_time))
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_ready.set()
+
+    async def flush(self) -> bool:
+        """Сброс накопленных заказов в БД"""
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:len(batch)]
+
+            start = time.perf_counter()
+            saved, rejected, retry = await self._save_isolating(batch)
+            latency = time.perf_counter() - start
+
+            if retry:
+                # Сбой соединения: возвращаем заказы в начало очереди, чтобы не потерять их
+                self._pending[:0] = retry
+                self.failed_flush_count += 1
+            if rejected:
+                self._reject(rejected)
+            if not saved:
+                return not retry
+
+            self.flush_count += 1
+            self.orders_flushed += saved
+            self.last_batch_size = saved
+            self.max_batch_seen = max(self.max_batch_seen, saved)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            return not retry
+
+    async def _save_isolating(self, batch: List[Tuple[str, datetime]]) -> Tuple[
+            int, List[Tuple[str, datetime]], List[Tuple[str, datetime]]]:
+        """
+        Запись пакета с делением пополам при ошибке данных
+        Возвращает (сохранено заказов, заказы с ошибкой данных, заказы для повтора)
+        """
+        try:
+            saved = await self.db.save_orders_bulk(batch, raise_data_errors=True)
+        except OrderDataError:
+            if len(batch) == 1:
+                return 0, batch, []
+            middle = len(batch) // 2
+            saved_left, rejected_left, retry_left = await self._save_isolating(batch[:middle])
+            saved_right, rejected_right, retry_right = await self._save_isolating(batch[middle:])
+            return saved_left + saved_right, rejected_left + rejected_right, retry_left + retry_right
+        return saved, [], [] if saved else batch
+
+    def _reject(self, orders: List[Tuple[str, datetime]]):
+        self.dead_letter.extend(orders)
+        self.dropped_orders += len(orders)
+        logger.error(f"Отброшено {len(orders)} заказов, которые не удалось сохранить: {orders[:5]}")
+
+    async def _run(self):
+        """Цикл сброса по времени или по размеру пакета"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+
+            try:
+                while self._pending:
+                    if not await self.flush():
+                        break
+                    if len(self._pending) < self.max_batch_size:
+                        break
+            except Exception as e:
+                logger.error(f"Ошибка сброса буфера заказов: {e}")
+
+    async def close(self):
+        """Остановка фоновой задачи и сброс остатка буфера"""
+        if self._task:
+            # Не отменяем задачу, чтобы не потерять пакет, который уже пишется в БД
+            self._stopping = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+
+        while self._pending:
+            if not await self.flush():
+                logger.error(f"Не удалось сохранить {len(self._pending)} заказов из буфера")
+                break
+
+        logger.info(f"Буфер заказов закрыт: {self.get_metrics()}")
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Метрики буфера"""
+        return {
+            "pending": len(self._pending),
+            "flush_count": self.flush_count,
+            "failed_flush_count": self.failed_flush_count,
+            "dropped_orders": self.dropped_orders,
+            "orders_flushed": self.orders_flushed,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_seen,
+            "avg_batch_size": self.orders_flushed / self.flush_count if self.flush_count else 0,
+            "last_flush_latency_ms": self.last_flush_latency * 1000,
+            "max_flush_latency_ms": self.max_flush_latency * 1000,
+            "avg_flush_latency_ms": self.total_flush_latency / self.flush_count * 1000 if self.flush_count else 0
+        }
+
+
+class ActivityTracker:
+    """
+    Отложенное обновление last_active пользователей
+    Касания копятся в словаре chat_id -> время последнего действия (повторные
+    касания одного чата схлопываются) и раз в flush_interval_ms уходят в БД
+    одним UPDATE ... FROM unnest. Размер словаря ограничен max_pending:
+    при переполнении касания новых чатов отбрасываются до ближайшего сброса
+    """
+
+    def __init__(self, db: Database, flush_interval_ms: int = 5000,
+                 max_batch_size: int = 5000, max_pending: int = 50000):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_pending = max(max_pending, max_batch_size)
+
+        self._dirty: Dict[int, datetime] = {}
+        self._flush_lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Счетчики
+        self.touches = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.flush_count = 0
+        self.failed_flush_count = 0
+        self.users_flushed = 0
+
+    def start(self):
+        """Запуск фоновой задачи сброса"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def touch(self, chat_id: int, at: Optional[datetime] = None):
+        """Отметка активности пользователя (без обращения к БД)"""
+        self.touches += 1
+        if chat_id in self._dirty:
+            self.coalesced += 1
+        elif len(self._dirty) >= self.max_pending:
+            self.dropped += 1
+            self._batch_ready.set()
+            return
+        self._dirty[chat_id] = at or datetime.now()
+
+        if len(self._dirty) >= self.max_batch_size:
+            self._batch_ready.set()
+
+    async def flush(self) -> bool:
+        """Сброс накопленных касаний в БД"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return True
+
+            batch = list(islice(self._dirty.items(), self.max_batch_size))
+            for chat_id, _ in batch:
+                del self._dirty[chat_id]
+
+            if not await self.db.touch_users_bulk(batch):
+                # Возвращаем пакет, не затирая более свежие касания
+                for chat_id, at in batch:
+                    if chat_id not in self._dirty and len(self._dirty) < self.max_pending:
+                        self._dirty[chat_id] = at
+                self.failed_flush_count += 1
+                return False
+
+            self.flush_count += 1
+            self.users_flushed += len(batch)
+            return True
+
+    async def _run(self):
+        """Цикл сброса по времени или по размеру пакета"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+
+            try:
+                while self._dirty:
+                    if not await self.flush():
+                        break
+                    if len(self._dirty) < self.max_batch_size:
+                        break
+            except Exception as e:
+                logger.error(f"Ошибка сброса активности пользователей: {e}")
+
+    async def close(self):
+        """Остановка фоновой задачи и сброс остатка"""
+        if self._task:
+            self._stopping = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+
+        while self._dirty:
+            if not await self.flush():
+                logger.error(f"Не удалось сохранить активность {len(self._dirty)} пользователей")
+                break
+
+        logger.info(f"Трекер активности закрыт: {self.get_metrics()}")
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Метрики трекера"""
+        return {
+            "pending": len(self._dirty),
+            "touches": self.touches,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "flush_count": self.flush_count,
+            "failed_flush_count": self.failed_flush_count,
+            "users_flushed": self.users_flushed,
+            # Сколько касаний в среднем заменяет одна строка UPDATE
+            "touches_per_row": self.touches / self.users_flushed if self.users_flushed else 0
+        }
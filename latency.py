@@ -0,0 +1,29 @@
+"""
+Гистограмма задержек для метрик доставки и обработчиков
+"""
+from bisect import bisect_left
+from typing import Any, Dict
+
+
+class LatencyHistogram:
+    """Гистограмма задержек доставки"""
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.BUCKETS_MS, seconds * 1000)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = {f"<={b}ms": c for b, c in zip(self.BUCKETS_MS, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0,
+            "buckets": buckets
+        }
@@ -0,0 +1,116 @@
+"""
+Выбор лидера среди экземпляров бота через аренду в PostgreSQL
+Запланированные отчеты отправляет только держатель аренды
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElector:
+    """
+    Аренда лидерства в таблице scheduler_leases
+    Лидер продлевает аренду каждые renew_interval секунд; если он перестал
+    это делать, через ttl секунд аренду забирает другой экземпляр и получает
+    новый маркер. Каждый запуск задачи регистрируется в scheduler_runs
+    с проверкой маркера, поэтому устаревший лидер не отправит отчет повторно
+    """
+
+    def __init__(self, db, name: str = "ozon_stats_scheduler", holder: Optional[str] = None,
+                 ttl: float = 15.0, renew_interval: float = 5.0):
+        if renew_interval >= ttl:
+            raise ValueError("renew_interval должен быть меньше ttl")
+        self.db = db
+        self.name = name
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+
+        self.token: Optional[int] = None
+        # Срок действия аренды по локальным часам: отсчитывается от момента
+        # отправки запроса, поэтому не позже срока в БД
+        self._valid_until = 0.0
+        self._stopping = False
+
+        # Метрики
+        self.elections_won = 0
+        self.leadership_lost = 0
+        self.claims_rejected = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None and time.monotonic() < self._valid_until
+
+    def _lose(self, reason: str):
+        if self.token is not None:
+            self.leadership_lost += 1
+            logger.warning(f"{self.holder}: лидерство потеряно ({reason})")
+        self.token = None
+        self._valid_until = 0.0
+
+    async def try_acquire(self) -> bool:
+        """Захват или продление аренды"""
+        started = time.monotonic()
+        token = await self.db.acquire_lease(self.name, self.holder, self.ttl)
+        if token is None:
+            self._lose("аренда у другого экземпляра")
+            return False
+
+        if self.token != token:
+            self.elections_won += 1
+            logger.info(f"{self.holder}: стал лидером, маркер {token}")
+        self.token = token
+        self._valid_until = started + self.ttl
+        return True
+
+    async def run(self):
+        """Цикл захвата и продления аренды до вызова stop()"""
+        self._stopping = False
+        try:
+            while not self._stopping:
+                await self.try_acquire()
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            await self.release()
+
+    async def release(self):
+        """Освобождение аренды, чтобы другой экземпляр стал лидером сразу"""
+        if self.token is not None:
+            await self.db.release_lease(self.name, self.holder)
+            self._lose("остановка")
+
+    def stop(self):
+        self._stopping = True
+
+    async def claim(self, job_name: str, slot: float) -> Optional[bool]:
+        """
+        Право на запуск задачи job_name за слот slot (момент по расписанию)
+        Проверка маркера выполняется в БД атомарно с регистрацией запуска.
+        None - экземпляр сейчас не лидер: планировщик повторит проверку,
+        и слот выполнит тот, кто станет лидером до истечения misfire_grace
+        """
+        if not self.is_leader:
+            return None
+        slot_at = datetime.fromtimestamp(slot, timezone.utc)
+        if await self.db.claim_scheduled_run(self.name, self.holder, self.token, job_name, slot_at):
+            return True
+        self.claims_rejected += 1
+        logger.info(f"{self.holder}: запуск {job_name} за {slot_at} отклонен")
+        return False
+
+    def get_metrics(self):
+        return {
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "token": self.token,
+            "elections_won": self.elections_won,
+            "leadership_lost": self.leadership_lost,
+            "claims_rejected": self.claims_rejected
+        }
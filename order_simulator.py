@@ -0,0 +1,102 @@
+"""
+Векторизованный генератор заказов для больших тестовых каталогов
+Повторяет правила MockOzonAPI, но считает все артикулы одним вызовом NumPy
+"""
+from datetime import date
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from article_registry import ArticleRegistry
+from ozon_stats_bot import ArticleStats
+
+
+class VectorizedMockOzonAPI:
+    """Имитация API Ozon на массивах NumPy (нагрузочное тестирование)"""
+
+    def __init__(self, articles: Sequence[str], names: Sequence[str], prices: Sequence[float],
+                 seed: Optional[int] = None):
+        self.articles = np.asarray(articles)
+        self.names = np.asarray(names)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+
+        # Заказы за текущий день: строка - артикул, столбец - час
+        self.day = date.today()
+        self.hourly_orders = np.zeros((len(self.articles), 24), dtype=np.int32)
+
+    @classmethod
+    def synthetic(cls, size: int, seed: Optional[int] = None) -> "VectorizedMockOzonAPI":
+        """Каталог из size случайных товаров"""
+        rng = np.random.default_rng(seed)
+        articles = [f"{i:06d}" for i in range(size)]
+        names = [f"Тестовый товар {i}" for i in range(size)]
+        prices = np.round(rng.uniform(500, 80000, size), 2)
+        return cls(articles, names, prices, seed=seed)
+
+    @classmethod
+    def from_registry(cls, registry: ArticleRegistry, seed: Optional[int] = None) -> "VectorizedMockOzonAPI":
+        """Симулятор по каталогу из общего реестра товаров"""
+        return cls(registry.codes, registry.names, registry.prices, seed=seed)
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    def generate_hourly_orders(self, current_hour: int) -> np.ndarray:
+        """
+        Генерация заказов за час для всех артикулов сразу
+        Больше заказов в часы пик (11-13, 19-21)
+        """
+        size = len(self)
+        if current_hour < 8 or current_hour > 22:
+            orders = self.rng.integers(0, 2, size)
+        else:
+            orders = self.rng.integers(0, 4, size)
+
+            # Часы пик
+            if 11 <= current_hour <= 13:
+                orders += self.rng.integers(2, 6, size)
+            elif 19 <= current_hour <= 21:
+                orders += self.rng.integers(3, 8, size)
+
+        # Случайные всплески: 10% шанс на каждый артикул
+        burst = self.rng.random(size) < 0.1
+        orders = np.where(burst, orders * self.rng.integers(2, 5, size), orders)
+
+        return orders.astype(np.int32)
+
+    def update_prices(self) -> np.ndarray:
+        """Имитация изменения цен (±2%)"""
+        change_percent = self.rng.uniform(-0.02, 0.02, len(self))
+        self.prices = np.round(self.prices * (1 + change_percent), 2)
+        return self.prices
+
+    def simulate_hour(self, hour: int):
+        """
+        Один час симуляции
+        Возвращает массивы (заказы за час, заказы за день, цены)
+        """
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.hourly_orders.fill(0)
+
+        hourly = self.generate_hourly_orders(hour)
+        self.hourly_orders[:, hour] += hourly
+        daily = self.hourly_orders[:, :hour + 1].sum(axis=1)
+        prices = self.update_prices()
+        return hourly, daily, prices
+
+    def get_stats_for_hour(self, hour: int) -> List[ArticleStats]:
+        """Совместимый с MockOzonAPI интерфейс"""
+        hourly, daily, prices = self.simulate_hour(hour)
+        return [
+            ArticleStats(
+                article=str(article),
+                name=str(name),
+                hourly_orders=int(h),
+                daily_orders=int(d),
+                price=float(p)
+            )
+            for article, name, h, d, p in zip(self.articles, self.names, hourly, daily, prices)
+        ]
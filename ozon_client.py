@@ -0,0 +1,173 @@
+"""
+Асинхронный сборщик статистики через HTTP API маркетплейса
+и локальный сервер-заглушка для тестов и бенчмарков
+"""
+import asyncio
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from article_registry import ArticleRegistry, get_article_registry
+from ozon_stats_bot import ArticleStats, MockOzonAPI
+
+logger = logging.getLogger(__name__)
+
+STATS_PATH = "/v1/analytics/hourly"
+
+
+class OzonAPIError(Exception):
+    """Ошибка ответа API"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class HttpOzonAPI:
+    """
+    Источник статистики для StatsCollector поверх HTTP
+    Артикулы запрашиваются пачками по batch_size, одновременно выполняется
+    не больше concurrency запросов через одну сессию aiohttp (keep-alive).
+    Ответы 429/5xx и сетевые ошибки повторяются с экспоненциальной
+    задержкой и джиттером; Retry-After сервера имеет приоритет
+    """
+
+    def __init__(self, base_url: str, registry: Optional[ArticleRegistry] = None,
+                 api_key: Optional[str] = None, batch_size: int = 100, concurrency: int = 8,
+                 max_retries: int = 3, retry_base_delay: float = 0.2, timeout: float = 10.0,
+                 session: Optional[aiohttp.ClientSession] = None):
+        self.url = base_url.rstrip("/") + STATS_PATH
+        self.registry = registry if registry is not None else get_article_registry()
+        self.headers = {"Api-Key": api_key} if api_key else {}
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = session
+        self._owns_session = session is None
+
+        # Метрики
+        self.requests = 0
+        self.retries = 0
+        self.failed_batches = 0
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=self.timeout
+            )
+            self._owns_session = True
+        return self.session
+
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _fetch_batch(self, session: aiohttp.ClientSession, skus: List[str], hour: int) -> List[Dict[str, Any]]:
+        """Один запрос с повторами"""
+        for attempt in range(self.max_retries + 1):
+            self.requests += 1
+            try:
+                async with session.post(self.url, json={"hour": hour, "skus": skus},
+                                        headers=self.headers) as response:
+                    if response.status == 200:
+                        return (await response.json())["items"]
+                    retry_after = response.headers.get("Retry-After")
+                    error = OzonAPIError(response.status, await response.text(),
+                                         float(retry_after) if retry_after else None)
+                # 4xx кроме 429 - ошибка запроса, повтор не поможет
+                if error.status != 429 and error.status < 500:
+                    raise error
+                if attempt == self.max_retries:
+                    raise error
+                delay = error.retry_after
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                delay = None
+
+            self.retries += 1
+            if delay is None:
+                delay = self.retry_base_delay * 2 ** attempt * (0.5 + random.random())
+            await asyncio.sleep(delay)
+
+    async def get_stats_for_hour(self, hour: int) -> List[ArticleStats]:
+        """Статистика по всем артикулам реестра; порядок - как в реестре"""
+        session = await self._get_session()
+        codes = list(self.registry.codes)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(skus: List[str]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self._fetch_batch(session, skus, hour)
+                except Exception as e:
+                    self.failed_batches += 1
+                    logger.error(f"Не удалось получить статистику {len(skus)} артикулов: {e}")
+                    return []
+
+        batches = await asyncio.gather(*(
+            fetch(codes[i:i + self.batch_size]) for i in range(0, len(codes), self.batch_size)
+        ))
+
+        stats = []
+        for items in batches:
+            for item in items:
+                sku = item["sku"]
+                if sku not in self.registry:
+                    # Товар удален из реестра, пока шел запрос
+                    continue
+                price = float(item["price"])
+                self.registry.set_price(sku, price)
+                stats.append(ArticleStats(
+                    article=sku,
+                    name=self.registry.get_name(sku, sku),
+                    hourly_orders=int(item["hourly_orders"]),
+                    daily_orders=int(item["daily_orders"]),
+                    price=price
+                ))
+        return stats
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {"requests": self.requests, "retries": self.retries, "failed_batches": self.failed_batches}
+
+
+async def start_stub_ozon_api(port: int, registry: Optional[ArticleRegistry] = None,
+                              fail_every: int = 0, latency: float = 0.0):
+    """
+    Локальный сервер статистики по правилам MockOzonAPI
+    fail_every > 0 - каждый N-й запрос получает 503; latency - задержка ответа, с
+    """
+    from aiohttp import web
+
+    api = MockOzonAPI(registry if registry is not None else ArticleRegistry.with_defaults())
+    counter = {"requests": 0, "skus": 0}
+
+    async def hourly_stats(request):
+        counter["requests"] += 1
+        payload = await request.json()
+        if latency:
+            await asyncio.sleep(latency)
+        if fail_every and counter["requests"] % fail_every == 0:
+            return web.json_response({"error": "temporarily unavailable"}, status=503)
+
+        stats = api.get_stats_for_articles(payload["skus"], int(payload["hour"]))
+        counter["skus"] += len(stats)
+        return web.json_response({"items": [
+            {"sku": item.article, "hourly_orders": item.hourly_orders,
+             "daily_orders": item.daily_orders, "price": item.price}
+            for item in stats
+        ]})
+
+    app = web.Application()
+    app.router.add_post(STATS_PATH, hourly_stats)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, counter
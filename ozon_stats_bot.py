@@ -1,9 +1,27 @@
 import asyncio
+import heapq
+import inspect
 import logging
-from datetime import datetime, time, timedelta
-from typing import Dict, List
+from array import array
+import os
+from datetime import date, datetime, time, tzinfo
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional
 import random
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from operator import attrgetter
+from zoneinfo import ZoneInfo
+
+from article_registry import ArticleRegistry, get_article_registry
+from broadcast import BroadcastEngine, broadcast_to_subscribers
+from collector_state import CollectorSnapshot, CollectorStateLog
+from latency import LatencyHistogram
+from leader import LeaderElector
+from report_store import ReportArtifactStore
+from scheduler import CATCH_UP_LATEST, CATCH_UP_SKIP, CronSchedule, Scheduler
+
+if TYPE_CHECKING:
+    from seller_reports import ShardedReportRunner
 
 
 # Настройка логирования
@@ -13,6 +31,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Максимальная длина одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
 
 @dataclass
 class ArticleStats:
@@ -27,39 +48,139 @@ class ArticleStats:
         return f"{self.article} - {self.name}: {self.hourly_orders} / {self.daily_orders} (цена: {self.price}₽)"
 
 
+@dataclass
+class StatsAggregate:
+    """Итоги по списку статистики, посчитанные за один проход"""
+    count: int = 0
+    total_hourly: int = 0
+    total_daily: int = 0
+    top: List[ArticleStats] = field(default_factory=list)  # по убыванию ключа
+
+
+def aggregate_stats(stats: List[ArticleStats], top_k: int = 3,
+                    key: Callable[[ArticleStats], float] = attrgetter("hourly_orders")) -> StatsAggregate:
+    """
+    Суммы и топ-K за один проход по статистике
+    Топ собирается в куче размера K: O(n log K) вместо сортировки всего списка.
+    При равных значениях ключа выше оказывается товар, идущий раньше в списке
+    """
+    total_hourly = 0
+    total_daily = 0
+    heap = []
+    threshold = None  # минимальный ключ в заполненной куче
+
+    for i, item in enumerate(stats):
+        total_hourly += item.hourly_orders
+        total_daily += item.daily_orders
+
+        if top_k > 0:
+            value = key(item)
+            if threshold is None:
+                heapq.heappush(heap, (value, -i, item))
+                if len(heap) == top_k:
+                    threshold = heap[0][0]
+            elif value > threshold:
+                # Равный ключ не вытесняет: более ранний товар важнее
+                heapq.heapreplace(heap, (value, -i, item))
+                threshold = heap[0][0]
+
+    return StatsAggregate(
+        count=len(stats),
+        total_hourly=total_hourly,
+        total_daily=total_daily,
+        top=[entry[2] for entry in sorted(heap, key=lambda e: e[:2], reverse=True)]
+    )
+
+
+class DailyOrderCounter:
+    """
+    Счетчик заказов товара по часам за один день
+    24 ячейки по часам и префиксные суммы: заказы за день до часа - O(1)
+    """
+    __slots__ = ("day", "hourly", "prefix")
+
+    def __init__(self, day: date):
+        self.day = day
+        self.hourly = array("l", [0] * 24)
+        self.prefix = array("l", [0] * 24)
+
+    @classmethod
+    def from_hourly(cls, day: date, hourly: Iterable[int]) -> "DailyOrderCounter":
+        """Счетчик по готовым заказам за 24 часа"""
+        counter = cls.__new__(cls)
+        counter.day = day
+        counter.hourly = array("l", hourly)
+        counter.prefix = array("l", accumulate(counter.hourly))
+        return counter
+
+    def reset(self, day: date):
+        """Переход на новый день"""
+        self.day = day
+        for hour in range(24):
+            self.hourly[hour] = 0
+            self.prefix[hour] = 0
+
+    def add(self, hour: int, count: int):
+        """Добавление заказов за час"""
+        if not count:
+            return
+        self.hourly[hour] += count
+        for h in range(hour, 24):
+            self.prefix[h] += count
+
+    def total_until(self, hour: int) -> int:
+        """Заказов за день до указанного часа включительно"""
+        return self.prefix[hour]
+
+
 class MockOzonAPI:
     """Мок-класс для имитации API Ozon"""
 
-    def __init__(self):
-        self.articles = {
-            "123456": "Смартфон Xiaomi Redmi Note 12",
-            "789012": "Наушники JBL Tune 510BT",
-            "345678": "Ноутбук ASUS VivoBook 15",
-            "901234": "Часы Apple Watch Series 9",
-            "567890": "Планшет Samsung Galaxy Tab S9",
-            "234567": "Фитнес-браслет Huawei Band 8",
-            "890123": "Колонка Яндекс Станция Мини 2",
-            "456789": "Монитор LG 24MP400-B",
-            "012345": "Клавиатура Logitech MX Keys",
-            "678901": "Мышь беспроводная Razer Viper"
-        }
+    def __init__(self, registry: Optional[ArticleRegistry] = None,
+                 state_log: Optional[CollectorStateLog] = None):
+        # Товары и текущие цены берутся из общего реестра
+        self.registry = registry if registry is not None else get_article_registry()
 
-        # Начальные цены
-        self.prices = {
-            "123456": 19999.99,
-            "789012": 3499.99,
-            "345678": 54999.99,
-            "901234": 42999.99,
-            "567890": 72999.99,
-            "234567": 2999.99,
-            "890123": 8999.99,
-            "456789": 12999.99,
-            "012345": 11999.99,
-            "678901": 6999.99
-        }
+        # Счетчики заказов за текущий день (артикул -> заказы по часам)
+        self.daily_counters: Dict[str, DailyOrderCounter] = {}
 
-        # История заказов за день (артикул -> список времен заказов)
-        self.daily_orders_history: Dict[str, List[datetime]] = {}
+        # Журнал на диске: счетчики и цены переживают перезапуск
+        self.state_log = state_log
+        # Записи журнала из разных сборов не должны перемешиваться
+        self._state_lock = asyncio.Lock()
+        if state_log is not None:
+            self.restore_state(state_log.load())
+
+    def restore_state(self, snapshot: Optional[CollectorSnapshot]):
+        """Восстановление счетчиков за сегодня и цен из снимка"""
+        if snapshot is None:
+            return
+        is_today = snapshot.day == date.today()
+        for i, code in enumerate(snapshot.codes):
+            if code not in self.registry:
+                continue
+            self.registry.set_price(code, snapshot.prices[i])
+            if is_today:
+                self.daily_counters[code] = DailyOrderCounter.from_hourly(snapshot.day, snapshot.counts_for(i))
+        logger.info(f"Состояние сборщика восстановлено за {snapshot.day}: {len(snapshot.codes)} товаров")
+
+    def _state_write(self, today: date, hour: int, stats: List[ArticleStats]) -> Callable[[], None]:
+        """
+        Запись состояния без обращения к счетчикам
+        Данные копируются сразу, поэтому саму запись можно выполнить в отдельном потоке
+        """
+        codes = [item.article for item in stats]
+        prices = [item.price for item in stats]
+        if self.state_log.needs_compaction():
+            hourly = array("i")
+            for code in codes:
+                hourly.fromlist(self.daily_counters[code].hourly.tolist())
+            return lambda: self.state_log.compact(today, codes, hourly, prices)
+        counts = [item.hourly_orders for item in stats]
+        return lambda: self.state_log.append_hour(today, hour, codes, counts, prices)
+
+    def _save_state(self, today: date, hour: int, stats: List[ArticleStats]):
+        self._state_write(today, hour, stats)()
 
     def generate_hourly_orders(self, article: str, current_hour: int) -> int:
         """
@@ -85,44 +206,67 @@ class MockOzonAPI:
     def update_price(self, article: str) -> float:
         """Имитация изменения цены"""
         change_percent = random.uniform(-0.02, 0.02)  # ±2%
-        self.prices[article] *= (1 + change_percent)
-        self.prices[article] = round(self.prices[article], 2)
-        return self.prices[article]
+        price = round(self.registry.get_price(article) * (1 + change_percent), 2)
+        self.registry.set_price(article, price)
+        return price
+
+    def _article_stats(self, article: str, name: str, hour: int, today: date) -> ArticleStats:
+        # Генерируем заказы за этот час
+        hourly_orders = self.generate_hourly_orders(article, hour)
+
+        # Обновляем счетчик, сбрасывая его при смене дня
+        counter = self.daily_counters.get(article)
+        if counter is None:
+            counter = self.daily_counters[article] = DailyOrderCounter(today)
+        elif counter.day != today:
+            counter.reset(today)
+        counter.add(hour, hourly_orders)
+
+        return ArticleStats(
+            article=article,
+            name=name,
+            hourly_orders=hourly_orders,
+            # Заказы за день (до текущего часа включительно)
+            daily_orders=counter.total_until(hour),
+            price=self.update_price(article)
+        )
+
+    def get_stats_for_articles(self, articles: Iterable[str], hour: int) -> List[ArticleStats]:
+        """Статистика за час по отдельным артикулам (неизвестные пропускаются)"""
+        today = date.today()
+        return [
+            self._article_stats(article, self.registry.get_name(article), hour, today)
+            for article in articles if article in self.registry
+        ]
 
     def get_stats_for_hour(self, hour: int) -> List[ArticleStats]:
         """Получение статистики для указанного часа"""
-        stats = []
-        current_time = datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0)
-
-        for article, name in self.articles.items():
-            # Генерируем заказы за этот час
-            hourly_orders = self.generate_hourly_orders(article, hour)
-
-            # Обновляем историю заказов
-            if article not in self.daily_orders_history:
-                self.daily_orders_history[article] = []
-
-            # Добавляем временные метки заказов
-            for _ in range(hourly_orders):
-                order_time = current_time + timedelta(minutes=random.randint(0, 59))
-                self.daily_orders_history[article].append(order_time)
-
-            # Считаем заказы за день (до текущего часа включительно)
-            daily_orders = len([
-                t for t in self.daily_orders_history.get(article, [])
-                if t.hour <= hour
-            ])
-
-            # Обновляем цену
-            price = self.update_price(article)
-
-            stats.append(ArticleStats(
-                article=article,
-                name=name,
-                hourly_orders=hourly_orders,
-                daily_orders=daily_orders,
-                price=price
-            ))
+        today = date.today()
+        stats = [self._article_stats(article, name, hour, today) for article, name, _ in self.registry]
+
+        if self.state_log is not None:
+            try:
+                self._save_state(today, hour, stats)
+            except OSError as e:
+                logger.error(f"Ошибка записи состояния сборщика: {e}")
+
+        return stats
+
+    async def get_stats_for_hour_async(self, hour: int) -> List[ArticleStats]:
+        """
+        Статистика за час для асинхронного сбора
+        Запись журнала (append и compact с fsync) выполняется в отдельном потоке,
+        чтобы не останавливать цикл событий
+        """
+        today = date.today()
+        stats = [self._article_stats(article, name, hour, today) for article, name, _ in self.registry]
+
+        if self.state_log is not None:
+            async with self._state_lock:
+                try:
+                    await asyncio.to_thread(self._state_write(today, hour, stats))
+                except OSError as e:
+                    logger.error(f"Ошибка записи состояния сборщика: {e}")
 
         return stats
 
@@ -130,71 +274,167 @@ class MockOzonAPI:
 class StatsCollector:
     """Сборщик статистики"""
 
-    def __init__(self):
-        self.api = MockOzonAPI()
+    def __init__(self, api=None, top_k: int = 3,
+                 top_key: Callable[[ArticleStats], float] = attrgetter("hourly_orders")):
+        # api - любой источник с методом get_stats_for_hour
+        # (например, VectorizedMockOzonAPI для нагрузочного тестирования)
+        self.api = api if api is not None else MockOzonAPI()
         self.current_hour = datetime.now().hour
+        self.top_k = top_k
+        self.top_key = top_key
 
     def collect_current_stats(self) -> List[ArticleStats]:
         """Сбор текущей статистики"""
         current_hour = datetime.now().hour
         return self.api.get_stats_for_hour(current_hour)
 
+    async def collect_current_stats_async(self) -> List[ArticleStats]:
+        """
+        Сбор текущей статистики без блокировки цикла событий
+        Асинхронный источник (например, HttpOzonAPI) ожидается напрямую,
+        у MockOzonAPI используется вариант с записью журнала в отдельном потоке
+        """
+        current_hour = datetime.now().hour
+        get_async = getattr(self.api, "get_stats_for_hour_async", None)
+        if get_async is not None:
+            return await get_async(current_hour)
+        result = self.api.get_stats_for_hour(current_hour)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def aggregate(self, stats: List[ArticleStats]) -> StatsAggregate:
+        """Итоги и топ товаров за один проход"""
+        return aggregate_stats(stats, top_k=self.top_k, key=self.top_key)
+
     def get_top_performers(self, stats: List[ArticleStats], limit: int = 3) -> List[ArticleStats]:
         """Получение топовых товаров по заказам за час"""
-        return sorted(stats, key=lambda x: x.hourly_orders, reverse=True)[:limit]
+        return aggregate_stats(stats, top_k=limit, key=self.top_key).top
 
 
 class ReportGenerator:
     """Генератор отчетов"""
 
     @staticmethod
-    def generate_hourly_report(stats: List[ArticleStats],
-                               top_performers: List[ArticleStats]) -> str:
-        """Генерация часового отчета"""
+    def iter_hourly_report_lines(stats: List[ArticleStats],
+                                 top_performers: Optional[List[ArticleStats]] = None,
+                                 aggregate: Optional[StatsAggregate] = None,
+                                 detail_limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Строки часового отчета по одной
+        detail_limit - показать в детальной статистике только топ-N товаров
+        и одну строку с итогом по остальным
+        """
+        if aggregate is None:
+            aggregate = aggregate_stats(stats)
+        if top_performers is None:
+            top_performers = aggregate.top
+
         current_time = datetime.now().strftime("%d.%m.%Y %H:%M")
 
-        report = [
-            f"📊 Отчет по заказам Ozon",
-            f"🕐 Время отчета: {current_time}",
-            f"📈 Общая статистика:",
-            ""
-        ]
+        yield f"📊 Отчет по заказам Ozon"
+        yield f"🕐 Время отчета: {current_time}"
+        yield f"📈 Общая статистика:"
+        yield ""
 
         # Общая статистика
-        total_hourly = sum(s.hourly_orders for s in stats)
-        total_daily = sum(s.daily_orders for s in stats)
-
-        report.append(f"Всего заказов за час: {total_hourly}")
-        report.append(f"Всего заказов за день: {total_daily}")
-        report.append("")
+        yield f"Всего заказов за час: {aggregate.total_hourly}"
+        yield f"Всего заказов за день: {aggregate.total_daily}"
+        yield ""
 
         # Топ товаров
         if top_performers:
-            report.append("🏆 Топ товаров за час:")
+            yield "🏆 Топ товаров за час:"
             for i, item in enumerate(top_performers, 1):
-                report.append(f"{i}. {item.format_report()}")
-            report.append("")
+                yield f"{i}. {item.format_report()}"
+            yield ""
 
         # Детальная статистика
-        report.append("📋 Детальная статистика по артикулам:")
-        for item in stats:
-            report.append(f"• {item.format_report()}")
+        yield "📋 Детальная статистика по артикулам:"
+        if detail_limit is None or detail_limit >= len(stats):
+            for item in stats:
+                yield f"• {item.format_report()}"
+            return
+
+        detail = aggregate_stats(stats, top_k=detail_limit)
+        for item in detail.top:
+            yield f"• {item.format_report()}"
+
+        rest_count = len(stats) - len(detail.top)
+        rest_hourly = detail.total_hourly - sum(item.hourly_orders for item in detail.top)
+        rest_daily = detail.total_daily - sum(item.daily_orders for item in detail.top)
+        yield f"• … еще {rest_count} товаров: {rest_hourly} / {rest_daily}"
 
-        return "\n".join(report)
+    @staticmethod
+    def split_into_messages(lines: Iterable[str],
+                            max_length: int = TELEGRAM_MESSAGE_LIMIT) -> Iterator[str]:
+        """
+        Склейка строк в сообщения не длиннее max_length
+        Разрыв делается по границе строки; слишком длинная строка режется.
+        Длина считается в единицах UTF-16, как ее считает Telegram
+        (эмодзи занимают две единицы)
+        """
+        buffer: List[str] = []
+        length = 0
+
+        for line in lines:
+            line_length = len(line.encode("utf-16-le")) // 2
+            while line_length > max_length:
+                if buffer:
+                    yield "\n".join(buffer)
+                    buffer, length = [], 0
+                # Половина лимита в символах гарантированно влезает в лимит UTF-16
+                yield line[:max_length // 2]
+                line = line[max_length // 2:]
+                line_length = len(line.encode("utf-16-le")) // 2
+
+            # +1 на перевод строки перед новой строкой
+            added = line_length + (1 if buffer else 0)
+            if length + added > max_length:
+                yield "\n".join(buffer)
+                buffer, length = [], 0
+                added = line_length
+
+            buffer.append(line)
+            length += added
+
+        if buffer:
+            yield "\n".join(buffer)
+
+    @classmethod
+    def iter_hourly_report_chunks(cls, stats: List[ArticleStats],
+                                  aggregate: Optional[StatsAggregate] = None,
+                                  detail_limit: Optional[int] = None,
+                                  max_length: int = TELEGRAM_MESSAGE_LIMIT) -> Iterator[str]:
+        """Часовой отчет, разбитый на сообщения Telegram"""
+        lines = cls.iter_hourly_report_lines(stats, aggregate=aggregate, detail_limit=detail_limit)
+        return cls.split_into_messages(lines, max_length)
+
+    @classmethod
+    def generate_hourly_report(cls, stats: List[ArticleStats],
+                               top_performers: Optional[List[ArticleStats]] = None,
+                               aggregate: Optional[StatsAggregate] = None) -> str:
+        """Генерация часового отчета"""
+        return "\n".join(cls.iter_hourly_report_lines(stats, top_performers, aggregate))
 
     @staticmethod
-    def generate_summary_report(stats: List[ArticleStats]) -> str:
+    def generate_summary_report(stats: List[ArticleStats],
+                                aggregate: Optional[StatsAggregate] = None) -> str:
         """Краткий отчет для уведомлений"""
-        total_hourly = sum(s.hourly_orders for s in stats)
-        total_daily = sum(s.daily_orders for s in stats)
+        if aggregate is None:
+            aggregate = aggregate_stats(stats, top_k=1)
 
-        top_article = max(stats, key=lambda x: x.hourly_orders)
+        if aggregate.top:
+            top_article = aggregate.top[0]
+            top = f"{top_article.article} ({top_article.hourly_orders})"
+        else:
+            top = "-"
 
         return (
             f"🕐 {datetime.now().strftime('%H:%M')} | "
-            f"За час: {total_hourly} | "
-            f"За день: {total_daily} | "
-            f"Топ: {top_article.article} ({top_article.hourly_orders})"
+            f"За час: {aggregate.total_hourly} | "
+            f"За день: {aggregate.total_daily} | "
+            f"Топ: {top}"
         )
 
 
@@ -226,82 +466,297 @@ class NotificationService:
         print("\n".join(short_report) + "\n...")
 
     @staticmethod
-    def simulate_email_send(report: str, email: str = "admin@example.com"):
+    def simulate_email_send(report: str, email: str = "admin@example.com", part: int = 1):
         """Имитация отправки email"""
         print(f"[Email] Отправка отчета на {email}")
-        print(f"Тема: Ozon отчет за {datetime.now().strftime('%H:%M')}")
+        subject = f"Тема: Ozon отчет за {datetime.now().strftime('%H:%M')}"
+        print(subject if part == 1 else f"{subject} (часть {part})")
         print(f"Длина отчета: {len(report)} символов")
 
 
+@dataclass
+class NotificationChannel:
+    """Канал доставки отчетов"""
+    name: str
+    send: Callable[[str, int], Any]  # (текст, номер части)
+    blocking: bool = False  # синхронный ввод-вывод - выполнять в потоке
+    timeout: float = 10.0
+    retries: int = 2
+
+
+class NotificationDispatcher:
+    """
+    Асинхронная рассылка отчета по всем каналам одновременно
+    У каждого канала свой таймаут и повторы с джиттером; ошибка одного
+    канала не мешает остальным. Блокирующие каналы выполняются в потоке
+    """
+
+    def __init__(self, channels: List[NotificationChannel], retry_base_delay: float = 0.5):
+        self.channels = {channel.name: channel for channel in channels}
+        self.retry_base_delay = retry_base_delay
+        self.latency = {name: LatencyHistogram() for name in self.channels}
+        self.failures = {name: 0 for name in self.channels}
+
+    @classmethod
+    def from_service(cls, service: NotificationService) -> "NotificationDispatcher":
+        """Каналы на основе методов NotificationService"""
+        return cls([
+            NotificationChannel("console", lambda report, part: service.send_to_console(report)),
+            NotificationChannel("file", lambda report, part: service.save_to_file(report), blocking=True),
+            NotificationChannel("telegram", lambda report, part: service.simulate_telegram_send(report)),
+            NotificationChannel("email", lambda report, part: service.simulate_email_send(report, part=part)),
+        ])
+
+    async def _call(self, channel: NotificationChannel, report: str, part: int):
+        """Один вызов канала"""
+        if channel.blocking:
+            return await asyncio.to_thread(channel.send, report, part)
+        result = channel.send(report, part)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def _deliver(self, channel: NotificationChannel, report: str, part: int) -> bool:
+        """Доставка в канал с таймаутом и повторами"""
+        start = asyncio.get_running_loop().time()
+        for attempt in range(channel.retries + 1):
+            try:
+                await asyncio.wait_for(self._call(channel, report, part), timeout=channel.timeout)
+                self.latency[channel.name].observe(asyncio.get_running_loop().time() - start)
+                return True
+            except Exception as e:
+                logger.warning(f"Канал {channel.name}: попытка {attempt + 1} не удалась: {e!r}")
+                if channel.blocking and isinstance(e, asyncio.TimeoutError):
+                    # Поток нельзя прервать: он может еще дописать отчет,
+                    # повтор записал бы его второй раз
+                    break
+                if attempt < channel.retries:
+                    # Экспоненциальная задержка с полным джиттером
+                    await asyncio.sleep(random.uniform(0, self.retry_base_delay * 2 ** attempt))
+
+        self.failures[channel.name] += 1
+        logger.error(f"Не удалось доставить отчет в канал {channel.name}")
+        return False
+
+    async def dispatch(self, report: str, part: int = 1,
+                       channels: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """Отправка отчета в выбранные (по умолчанию - все) каналы"""
+        selected = [self.channels[name] for name in (channels or self.channels)]
+        results = await asyncio.gather(*(self._deliver(channel, report, part) for channel in selected))
+        return {channel.name: ok for channel, ok in zip(selected, results)}
+
+    async def dispatch_chunks(self, chunks: Iterable[str], channels: Optional[Iterable[str]] = None,
+                              pipeline_depth: int = 16) -> Dict[str, int]:
+        """
+        Отправка отчета из нескольких частей: у каждого канала своя очередь
+        Части в канал уходят по порядку, но медленный канал не задерживает
+        остальные - они уходят вперед на глубину очереди pipeline_depth.
+        Возвращает число доставленных частей по каналам
+        """
+        selected = [self.channels[name] for name in (channels or self.channels)]
+        queues = [asyncio.Queue(maxsize=pipeline_depth) for _ in selected]
+
+        async def consume(channel: NotificationChannel, queue: asyncio.Queue) -> int:
+            delivered = 0
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return delivered
+                part, report = item
+                if await self._deliver(channel, report, part):
+                    delivered += 1
+
+        consumers = [asyncio.create_task(consume(channel, queue)) for channel, queue in zip(selected, queues)]
+        try:
+            for item in enumerate(chunks, 1):
+                for queue in queues:
+                    await queue.put(item)
+            for queue in queues:
+                await queue.put(None)
+            results = await asyncio.gather(*consumers)
+        finally:
+            for consumer in consumers:
+                consumer.cancel()
+        return {channel.name: delivered for channel, delivered in zip(selected, results)}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Задержки доставки и число неудач по каналам"""
+        return {
+            name: {**self.latency[name].as_dict(), "failures": self.failures[name]}
+            for name in self.channels
+        }
+
+
 class OzonStatsBot:
     """Основной бот"""
 
-    def __init__(self, notification_service: NotificationService):
-        self.collector = StatsCollector()
+    # Рабочее время 8:30-23:30: отчеты в :30 каждого часа
+    REPORT_HOURS = range(8, 24)
+    EMAIL_HOURS = (9, 12, 15, 18, 21)
+
+    def __init__(self, notification_service: NotificationService, detail_limit: Optional[int] = None,
+                 tz: Optional[tzinfo] = None, leader: Optional[LeaderElector] = None,
+                 collector: Optional[StatsCollector] = None, broadcaster: Optional[BroadcastEngine] = None,
+                 seller_runner: Optional["ShardedReportRunner"] = None,
+                 seller_channels: Optional[List[str]] = None):
+        self.collector = collector if collector is not None else StatsCollector()
+        # Сколько товаров показывать в детальной статистике (None - все)
+        self.detail_limit = detail_limit
         self.notifier = notification_service
+        self.dispatcher = NotificationDispatcher.from_service(notification_service)
         self.report_generator = ReportGenerator()
         self.is_running = False
+        # Часовой пояс расписания (None - системный)
+        self.tz = tz
+
+        # Рассылка отчета подписчикам из bot_users (отчет формируется один раз на час)
+        self.broadcaster = broadcaster
+        self.report_store = ReportArtifactStore(broadcaster.db) if broadcaster is not None else None
+
+        # Последняя собранная статистика - для email и итоговой сводки
+        self.last_stats: Optional[List[ArticleStats]] = None
+        self.last_aggregate: Optional[StatsAggregate] = None
+        # Время сбора last_stats в часовом поясе расписания
+        self.last_collected_at: Optional[datetime] = None
+
+        # Отчеты множества продавцов, собираемые в процессах-шардах
+        self.seller_runner = seller_runner
+        self.seller_channels = seller_channels if seller_channels is not None else ["file"]
+
+        # При нескольких экземплярах задачи выполняет только лидер
+        self.leader = leader
+        self.scheduler = Scheduler(guard=leader.claim if leader is not None else None)
+        self.scheduler.add_job(
+            "hourly", CronSchedule.at(30, self.REPORT_HOURS, tz=tz),
+            lambda: self.collect_and_send_report(channels=["console", "file", "telegram"]),
+            catch_up=CATCH_UP_LATEST
+        )
+        self.scheduler.add_job(
+            "email", CronSchedule.at(35, self.EMAIL_HOURS, tz=tz),
+            lambda: self.send_last_report(["email"], detailed=True, period="hour"),
+            catch_up=CATCH_UP_LATEST
+        )
+        self.scheduler.add_job(
+            "summary", CronSchedule.at(45, [23], tz=tz),
+            lambda: self.send_last_report(["console", "telegram"], detailed=False, period="day"),
+            catch_up=CATCH_UP_SKIP
+        )
+        if seller_runner is not None:
+            self.scheduler.add_job(
+                "sellers", CronSchedule.at(40, self.REPORT_HOURS, tz=tz),
+                self.send_seller_reports,
+                catch_up=CATCH_UP_LATEST
+            )
 
     def should_run_now(self) -> bool:
-        """Проверка, должно ли выполняться сейчас (8:30-23:30)"""
-        now = datetime.now().time()
-        start_time = time(8, 30)
-        end_time = time(23, 30)
-        return start_time <= now <= end_time
-
-    async def collect_and_send_report(self, detailed: bool = True):
-        """Сбор и отправка отчета"""
-        if not self.should_run_now():
-            logger.info("Вне рабочего времени (8:30-23:30)")
-            return
-
+        """
+        Проверка, рабочее ли сейчас время (8:30-23:30) в часовом поясе расписания
+        Минута последнего слота 23:30 целиком входит в рабочее время
+        """
+        now = datetime.now(self.tz).time()
+        return time(8, 30) <= now < time(23, 31)
+
+    def _iter_report_chunks(self, stats: List[ArticleStats], aggregate: StatsAggregate,
+                            detailed: bool) -> Iterable[str]:
+        # Детальный отчет формируется по частям размером с сообщение Telegram
+        if detailed:
+            return self.report_generator.iter_hourly_report_chunks(
+                stats, aggregate=aggregate, detail_limit=self.detail_limit
+            )
+        return [self.report_generator.generate_summary_report(stats, aggregate=aggregate)]
+
+    async def _send_chunks(self, chunks: Iterable[str], channels: List[str]):
+        # Части по порядку, каждый канал - в своем темпе
+        await self.dispatcher.dispatch_chunks(chunks, channels=channels)
+
+    async def collect_and_send_report(self, detailed: bool = True, channels: Optional[List[str]] = None):
+        """
+        Сбор и отправка отчета
+        Рабочее время здесь не проверяется: его задают часы расписания (REPORT_HOURS)
+        """
         try:
             logger.info("Сбор статистики...")
 
             # Сбор данных
-            stats = self.collector.collect_current_stats()
-            top_performers = self.collector.get_top_performers(stats)
+            stats = await self.collector.collect_current_stats_async()
+            aggregate = self.collector.aggregate(stats)
+            self.last_stats, self.last_aggregate = stats, aggregate
+            self.last_collected_at = datetime.now(self.tz)
+
+            if channels is None:
+                # Каждый 3-й час отправляем email
+                channels = ["console", "file", "telegram"]
+                if datetime.now(self.tz).hour % 3 == 0:
+                    channels.append("email")
+
+            await self._send_chunks(self._iter_report_chunks(stats, aggregate, detailed), channels)
+
+            if self.broadcaster is not None:
+                await broadcast_to_subscribers(
+                    self.broadcaster, self.broadcaster.db, self.report_store,
+                    "hourly" if detailed else "summary", datetime.now(),
+                    lambda: self._iter_report_chunks(stats, aggregate, detailed)
+                )
 
-            # Генерация отчетов
-            if detailed:
-                report = self.report_generator.generate_hourly_report(stats, top_performers)
-            else:
-                report = self.report_generator.generate_summary_report(stats)
+            logger.info("Отчет успешно отправлен")
 
-            # Отправка уведомлений
-            self.notifier.send_to_console(report)
-            self.notifier.save_to_file(report)
-            self.notifier.simulate_telegram_send(report)
+        except Exception as e:
+            logger.error(f"Ошибка при формировании отчета: {e}")
 
-            # Каждый 3-й час отправляем email
-            if datetime.now().hour % 3 == 0:
-                self.notifier.simulate_email_send(report)
+    def _is_fresh(self, period: str) -> bool:
+        """Собрана ли последняя статистика в текущий час ("hour") или день ("day")"""
+        if self.last_collected_at is None:
+            return False
+        now = datetime.now(self.tz)
+        if period == "hour":
+            return self.last_collected_at.date() == now.date() and self.last_collected_at.hour == now.hour
+        return self.last_collected_at.date() == now.date()
 
-            logger.info("Отчет успешно отправлен")
+    async def send_last_report(self, channels: List[str], detailed: bool = True, period: str = "hour"):
+        """
+        Отправка отчета по последней собранной статистике (без нового сбора)
+        Статистика не из текущего часа/дня (period) не отправляется: например,
+        сбор в :30 не удался или экземпляр только что стал лидером
+        """
+        if self.last_stats is None:
+            logger.info("Статистика еще не собиралась, отчет не отправлен")
+            return
+        if not self._is_fresh(period):
+            logger.warning(f"Последняя статистика собрана {self.last_collected_at}, "
+                           f"отчет в {', '.join(channels)} не отправлен")
+            return
+        chunks = self._iter_report_chunks(self.last_stats, self.last_aggregate, detailed)
+        await self._send_chunks(chunks, channels)
 
+    async def send_seller_reports(self):
+        """Отчеты всех продавцов за текущий час (по мере готовности в шардах)"""
+        try:
+            await self.seller_runner.dispatch_reports(self.dispatcher, self.seller_channels,
+                                                      datetime.now(self.tz).hour)
         except Exception as e:
-            logger.error(f"Ошибка при формировании отчета: {e}")
+            logger.error(f"Ошибка при формировании отчетов продавцов: {e}")
 
     async def run_scheduler(self):
-        """Запуск планировщика"""
+        """Запуск планировщика: почасовой отчет, email каждые 3 часа, итоговая сводка"""
         self.is_running = True
         logger.info("Бот запущен. Ожидание 8:30 для начала работы...")
-
-        while self.is_running:
-            now = datetime.now()
-
-            # Проверяем каждый час в :30
-            if now.minute == 30 and self.should_run_now():
-                await self.collect_and_send_report()
-                # Ждем 61 минуту чтобы не выполнить дважды в одном часе
-                await asyncio.sleep(61)
-            else:
-                # Каждую минуту проверяем время
-                await asyncio.sleep(60)
+        leader_task = asyncio.create_task(self.leader.run()) if self.leader is not None else None
+        if self.seller_runner is not None:
+            # Процессы-шарды запускаются заранее, а не в первом отчете
+            await self.seller_runner.warm_up()
+        try:
+            await self.scheduler.run()
+        finally:
+            self.is_running = False
+            if leader_task is not None:
+                self.leader.stop()
+                leader_task.cancel()
+                await asyncio.gather(leader_task, return_exceptions=True)
 
     def stop(self):
         """Остановка бота"""
         self.is_running = False
+        self.scheduler.stop()
         logger.info("Бот остановлен")
 
 
@@ -309,7 +764,95 @@ async def main():
     """Основная функция"""
     # Инициализация сервисов
     notifier = NotificationService()
-    bot = OzonStatsBot(notifier)
+    # Часовой пояс расписания, например Europe/Moscow (по умолчанию - системный)
+    tz_name = os.getenv("REPORT_TIMEZONE")
+
+    # Несколько экземпляров согласуют лидера через аренду в PostgreSQL,
+    # рассылка подписчикам берет их список из bot_users
+    use_leader = os.getenv("LEADER_ELECTION", "").lower() in ("1", "true", "yes")
+    telegram_token = os.getenv("TELEGRAM_TOKEN")
+    use_broadcast = bool(telegram_token) and os.getenv("TELEGRAM_BROADCAST", "").lower() in ("1", "true", "yes")
+    # Каталог товаров: файл CSV/Parquet или таблица articles (общая с ботом и веб-панелью)
+    articles_path = os.getenv("ARTICLES_PATH")
+    use_db_articles = os.getenv("ARTICLES_FROM_DB", "").lower() in ("1", "true", "yes")
+    db = None
+    leader = None
+    broadcaster = None
+    if use_leader or use_broadcast or use_db_articles:
+        from database import Database
+
+        db = Database(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "5432")),
+            database=os.getenv("DB_NAME", "ozon_bot_db"),
+            user=os.getenv("DB_USER", "ozon_bot_user"),
+            password=os.getenv("DB_PASSWORD", "password123"),
+            min_pool_size=1,
+            max_pool_size=2
+        )
+        if not await db.connect():
+            logger.error("Нет подключения к БД: выбор лидера, рассылка и каталог из БД недоступны")
+            return
+    if use_leader:
+        if not await db.ensure_leader_schema():
+            logger.error("Выбор лидера недоступен: не удалось создать таблицы")
+            await db.close()
+            return
+        leader = LeaderElector(
+            db,
+            ttl=float(os.getenv("LEADER_TTL", "15")),
+            renew_interval=float(os.getenv("LEADER_RENEW_INTERVAL", "5"))
+        )
+    if use_broadcast:
+        broadcaster = BroadcastEngine(
+            telegram_token, db=db,
+            api_base=os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+        )
+
+    # Отчеты продавцов: по файлу каталога на продавца, сбор в пуле процессов
+    seller_catalogs_path = os.getenv("SELLER_CATALOGS_DIR")
+    seller_runner = None
+    if seller_catalogs_path:
+        from seller_reports import ShardedReportRunner, load_seller_catalogs
+
+        seller_runner = ShardedReportRunner(
+            load_seller_catalogs(seller_catalogs_path),
+            workers=int(os.getenv("SELLER_REPORT_WORKERS", "4")),
+            batch_size=int(os.getenv("SELLER_REPORT_BATCH_SIZE", "8"))
+        )
+    seller_channels = [c.strip() for c in os.getenv("SELLER_REPORT_CHANNELS", "file").split(",") if c.strip()]
+
+    registry = get_article_registry()
+    refresh_task = None
+    if articles_path:
+        registry.clear()
+        if articles_path.endswith(".parquet"):
+            registry.load_parquet(articles_path)
+        else:
+            registry.load_csv(articles_path)
+    elif db is not None:
+        await registry.refresh_from_db(db)
+        refresh_task = asyncio.create_task(
+            registry.run_refresh(db, float(os.getenv("ARTICLES_REFRESH_INTERVAL", "60")))
+        )
+
+    # Журнал состояния сборщика: заказы за день не обнуляются при перезапуске
+    state_path = os.getenv("COLLECTOR_STATE_PATH", "collector_state.bin")
+    api_url = os.getenv("OZON_API_URL")
+    if api_url:
+        from ozon_client import HttpOzonAPI
+
+        # Статистика из HTTP API: счетчики за день хранит сам API
+        api = HttpOzonAPI(api_url, api_key=os.getenv("OZON_API_KEY"),
+                          batch_size=int(os.getenv("OZON_API_BATCH_SIZE", "100")),
+                          concurrency=int(os.getenv("OZON_API_CONCURRENCY", "8")))
+    else:
+        api = MockOzonAPI(state_log=CollectorStateLog(state_path))
+    collector = StatsCollector(api)
+
+    bot = OzonStatsBot(notifier, tz=ZoneInfo(tz_name) if tz_name else None, leader=leader,
+                       collector=collector, broadcaster=broadcaster,
+                       seller_runner=seller_runner, seller_channels=seller_channels)
 
     try:
         # Запускаем бота
@@ -320,6 +863,16 @@ async def main():
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
         bot.stop()
+    finally:
+        if refresh_task is not None:
+            refresh_task.cancel()
+            await asyncio.gather(refresh_task, return_exceptions=True)
+        if api_url:
+            await api.close()
+        if seller_runner is not None:
+            await asyncio.to_thread(seller_runner.close)
+        if db is not None:
+            await db.close()
 
 
 if __name__ == "__main__":
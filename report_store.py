@@ -0,0 +1,84 @@
+"""
+Хранилище готовых отчетов
+Отчет формируется один раз на (тип, час) и рассылается всем подписчикам,
+а sent_reports ссылается на него по хэшу содержимого
+"""
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, Tuple
+
+from cache import AsyncTTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class ReportStoreError(Exception):
+    """Отчет не удалось сохранить в report_artifacts"""
+
+
+@dataclass(frozen=True)
+class ReportArtifact:
+    """Сформированный отчет, разбитый на сообщения"""
+    report_type: str
+    report_hour: datetime
+    parts: Tuple[str, ...]
+    content_hash: str
+
+    @classmethod
+    def from_parts(cls, report_type: str, report_hour: datetime,
+                   parts: Iterable[str]) -> "ReportArtifact":
+        parts = tuple(parts)
+        content_hash = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+        return cls(report_type, report_hour, parts, content_hash)
+
+    @property
+    def content(self) -> str:
+        return "\n".join(self.parts)
+
+
+class ReportArtifactStore:
+    """
+    Кэш отчетов по (тип, час) с сохранением в report_artifacts
+    Одновременные запросы одного отчета ждут одно формирование. Таблица
+    создается при первом сохранении; отчет, который не удалось сохранить,
+    не кэшируется (на него не смогут сослаться записи sent_reports)
+    """
+
+    def __init__(self, db=None, ttl: float = 2 * 3600, max_entries: int = 64):
+        self.db = db
+        self._cache = AsyncTTLCache(ttl=ttl, max_size=max_entries)
+        self._schema_ready = False
+
+    async def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        if not await self.db.ensure_report_artifacts_schema():
+            raise ReportStoreError("не удалось создать таблицу report_artifacts")
+        self._schema_ready = True
+
+    @staticmethod
+    def _hour(moment: datetime) -> datetime:
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    async def get_or_render(self, report_type: str, moment: datetime,
+                            render: Callable[[], Iterable[str]]) -> ReportArtifact:
+        """Готовый отчет за час moment; render вызывается только при промахе"""
+        report_hour = self._hour(moment)
+
+        async def load() -> ReportArtifact:
+            artifact = ReportArtifact.from_parts(report_type, report_hour, render())
+            if self.db is not None:
+                await self._ensure_schema()
+                saved = await self.db.save_report_artifact(
+                    artifact.content_hash, report_type, report_hour, artifact.content
+                )
+                if not saved:
+                    raise ReportStoreError(f"отчет {report_type} за {report_hour} не сохранен")
+            return artifact
+
+        return await self._cache.get_or_load((report_type, report_hour), load)
+
+    def get_metrics(self):
+        return self._cache.get_metrics()
@@ -0,0 +1,240 @@
+"""
+Планировщик задач по расписанию в стиле cron
+Время следующего запуска вычисляется заранее, между запусками задача спит
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, tzinfo
+from datetime import time as dtime
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Политики обработки пропущенных запусков
+CATCH_UP_SKIP = "skip"      # пропущенные запуски не выполняются
+CATCH_UP_LATEST = "latest"  # один запуск вместо всех пропущенных
+CATCH_UP_ALL = "all"        # выполняются все пропущенные запуски
+CATCH_UP_POLICIES = (CATCH_UP_SKIP, CATCH_UP_LATEST, CATCH_UP_ALL)
+
+
+def _to_timestamp(wall: datetime, tz: Optional[tzinfo]) -> float:
+    """Момент времени для локального (настенного) времени wall"""
+    if tz is None:
+        return wall.timestamp()
+    return wall.replace(tzinfo=tz).timestamp()
+
+
+def _from_timestamp(ts: float, tz: Optional[tzinfo]) -> datetime:
+    """Настенное время в часовом поясе tz (None - системный)"""
+    return datetime.fromtimestamp(ts, tz).replace(tzinfo=None)
+
+
+@dataclass(frozen=True)
+class CronSchedule:
+    """
+    Расписание «минута, часы, дни недели»
+    Время задается по настенным часам часового пояса tz: при переходе на
+    летнее время несуществующий запуск сдвигается на момент после перехода,
+    при переходе на зимнее повторяющийся час выполняется один раз
+    """
+    minute: int = 0
+    hours: FrozenSet[int] = frozenset(range(24))
+    weekdays: Optional[FrozenSet[int]] = None  # 0 - понедельник; None - все дни
+    tz: Optional[tzinfo] = None
+
+    @classmethod
+    def at(cls, minute: int, hours: Iterable[int] = range(24), weekdays: Optional[Iterable[int]] = None,
+           tz: Optional[tzinfo] = None) -> "CronSchedule":
+        hours = frozenset(hours)
+        if not hours or not all(0 <= h <= 23 for h in hours):
+            raise ValueError(f"Некорректные часы расписания: {sorted(hours)}")
+        if not 0 <= minute <= 59:
+            raise ValueError(f"Некорректная минута расписания: {minute}")
+        return cls(minute, hours, None if weekdays is None else frozenset(weekdays), tz)
+
+    def next_after(self, ts: float) -> float:
+        """Ближайший запуск строго после момента ts"""
+        day = _from_timestamp(ts, self.tz).date()
+        hours = sorted(self.hours)
+        for offset in range(8):
+            current = day + timedelta(days=offset)
+            if self.weekdays is not None and current.weekday() not in self.weekdays:
+                continue
+            for hour in hours:
+                fire_at = _to_timestamp(datetime.combine(current, dtime(hour, self.minute)), self.tz)
+                if fire_at > ts:
+                    return fire_at
+        raise ValueError("Расписание не содержит ни одного запуска")
+
+
+@dataclass
+class JobMetrics:
+    """Статистика выполнения задачи"""
+    runs: int = 0
+    failures: int = 0
+    missed: int = 0       # пропущенные и не выполненные по политике запуски
+    caught_up: int = 0    # запуски, выполненные с опозданием
+    fenced: int = 0       # запуски, не разрешенные guard (например, не лидер)
+    total_duration: float = 0.0
+    max_duration: float = 0.0
+    last_duration: float = 0.0
+    last_run_at: Optional[datetime] = None
+    next_run_at: Optional[datetime] = None
+
+    def observe(self, duration: float):
+        self.runs += 1
+        self.total_duration += duration
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "missed": self.missed,
+            "caught_up": self.caught_up,
+            "fenced": self.fenced,
+            "avg_duration": self.total_duration / self.runs if self.runs else 0.0,
+            "max_duration": self.max_duration,
+            "last_duration": self.last_duration,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None
+        }
+
+
+@dataclass
+class ScheduledJob:
+    """Задача планировщика"""
+    name: str
+    schedule: CronSchedule
+    callback: Callable[[], Awaitable[Any]]
+    catch_up: str = CATCH_UP_LATEST
+    # Опоздание (с), после которого запуск считается пропущенным
+    misfire_grace: float = 60.0
+    metrics: JobMetrics = field(default_factory=JobMetrics)
+
+
+class Scheduler:
+    """
+    Планировщик нескольких задач
+    Каждая задача выполняется в своей корутине: спит ровно до следующего
+    запуска, запуски одной задачи не перекрываются. Если запуск опоздал
+    (долгий предыдущий запуск, сон системы), пропущенные запуски
+    обрабатываются по политике catch_up задачи. Необязательный guard(имя, слот)
+    вызывается перед каждым запуском и может его запретить (False). Ответ None -
+    решение пока невозможно (например, лидер еще не выбран): guard повторяется
+    каждые guard_retry_interval секунд, пока не истечет misfire_grace задачи
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time,
+                 guard: Optional[Callable[[str, float], Awaitable[Optional[bool]]]] = None,
+                 guard_retry_interval: float = 1.0):
+        self.clock = clock
+        self.guard = guard
+        self.guard_retry_interval = guard_retry_interval
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add_job(self, name: str, schedule: CronSchedule, callback: Callable[[], Awaitable[Any]],
+                catch_up: str = CATCH_UP_LATEST, misfire_grace: float = 60.0) -> ScheduledJob:
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Неизвестная политика пропущенных запусков: {catch_up}")
+        if name in self.jobs:
+            raise ValueError(f"Задача {name} уже добавлена")
+        job = ScheduledJob(name, schedule, callback, catch_up, misfire_grace)
+        self.jobs[name] = job
+        return job
+
+    async def _sleep_until(self, ts: float):
+        # Системные часы могут сдвинуться во время сна - проверяем после пробуждения
+        while True:
+            delay = ts - self.clock()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _check_guard(self, job: ScheduledJob, slot: float) -> Optional[bool]:
+        try:
+            return await self.guard(job.name, slot)
+        except Exception as e:
+            logger.error(f"Ошибка проверки запуска {job.name}: {e}")
+            return None
+
+    async def _execute(self, job: ScheduledJob, slot: float):
+        if self.guard is not None:
+            allowed = await self._check_guard(job, slot)
+            # Например, лидер упал незадолго до слота: ждем выбора нового
+            while allowed is None and self.clock() - slot < job.misfire_grace:
+                await asyncio.sleep(self.guard_retry_interval)
+                allowed = await self._check_guard(job, slot)
+            if not allowed:
+                job.metrics.fenced += 1
+                return
+
+        start = time.perf_counter()
+        job.metrics.last_run_at = _from_timestamp(self.clock(), job.schedule.tz)
+        try:
+            await job.callback()
+        except Exception as e:
+            job.metrics.failures += 1
+            logger.error(f"Ошибка задачи {job.name}: {e}")
+        finally:
+            duration = time.perf_counter() - start
+            job.metrics.observe(duration)
+            logger.info(f"Задача {job.name} выполнена за {duration:.2f} с")
+
+    def _due_slots(self, job: ScheduledJob, first: float, now: float) -> List[float]:
+        """Все запуски от first до текущего момента"""
+        slots = [first]
+        while True:
+            following = job.schedule.next_after(slots[-1])
+            if following > now:
+                return slots
+            slots.append(following)
+
+    async def _run_job(self, job: ScheduledJob):
+        fire_at = job.schedule.next_after(self.clock())
+        logger.info(f"Задача {job.name}: первый запуск {_from_timestamp(fire_at, job.schedule.tz)}")
+        while True:
+            job.metrics.next_run_at = _from_timestamp(fire_at, job.schedule.tz)
+            await self._sleep_until(fire_at)
+
+            now = self.clock()
+            if now - fire_at <= job.misfire_grace:
+                await self._execute(job, fire_at)
+                fire_at = job.schedule.next_after(fire_at)
+                continue
+
+            slots = self._due_slots(job, fire_at, now)
+            if job.catch_up == CATCH_UP_SKIP:
+                job.metrics.missed += len(slots)
+                logger.warning(f"Задача {job.name}: пропущено запусков - {len(slots)}")
+            elif job.catch_up == CATCH_UP_LATEST:
+                job.metrics.missed += len(slots) - 1
+                job.metrics.caught_up += 1
+                await self._execute(job, slots[-1])
+            else:
+                job.metrics.caught_up += len(slots)
+                for slot in slots:
+                    await self._execute(job, slot)
+            fire_at = job.schedule.next_after(slots[-1])
+
+    async def run(self):
+        """Запуск всех задач до вызова stop()"""
+        self._tasks = [asyncio.create_task(self._run_job(job), name=job.name) for job in self.jobs.values()]
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика выполнения по задачам"""
+        return {name: job.metrics.as_dict() for name, job in self.jobs.items()}
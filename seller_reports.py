@@ -0,0 +1,176 @@
+"""
+Отчеты для множества продавцов в пуле процессов
+Каждый продавец закреплен за своим процессом-шардом, где живет его
+сборщик статистики; готовые отчеты возвращаются в цикл событий по мере готовности
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from article_registry import ArticleRegistry
+from ozon_stats_bot import MockOzonAPI, ReportGenerator, aggregate_stats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SellerReport:
+    """Готовый отчет продавца"""
+    seller_id: str
+    chunks: List[str]
+    total_hourly: int
+    total_daily: int
+    render_time: float  # сбор и формирование в процессе-шарде, с
+
+
+def synthetic_catalogs(sellers: int, articles: int, seed: Optional[int] = None) -> Dict[str, ArticleRegistry]:
+    """Тестовые каталоги: sellers продавцов по articles товаров"""
+    rng = random.Random(seed)
+    catalogs = {}
+    for s in range(sellers):
+        registry = ArticleRegistry()
+        for i in range(articles):
+            registry.upsert(f"{s:04d}{i:06d}", f"Товар {i} продавца {s}", round(rng.uniform(500, 80000), 2))
+        catalogs[f"seller-{s}"] = registry
+    return catalogs
+
+
+def load_seller_catalogs(path: str) -> Dict[str, ArticleRegistry]:
+    """
+    Каталоги продавцов из каталога с файлами .csv/.parquet
+    Один файл - один продавец, id продавца - имя файла без расширения
+    """
+    catalogs = {}
+    for filename in sorted(os.listdir(path)):
+        seller_id, ext = os.path.splitext(filename)
+        if ext not in (".csv", ".parquet"):
+            continue
+        registry = ArticleRegistry()
+        file_path = os.path.join(path, filename)
+        if ext == ".parquet":
+            registry.load_parquet(file_path)
+        else:
+            registry.load_csv(file_path)
+        catalogs[seller_id] = registry
+    logger.info(f"Загружены каталоги {len(catalogs)} продавцов из {path}")
+    return catalogs
+
+
+def render_seller_report(seller_id: str, api: MockOzonAPI, hour: int,
+                         detail_limit: Optional[int] = None, top_k: int = 3) -> SellerReport:
+    """Сбор статистики и формирование отчета одного продавца"""
+    start = time.perf_counter()
+    stats = api.get_stats_for_hour(hour)
+    aggregate = aggregate_stats(stats, top_k=top_k)
+    chunks = list(ReportGenerator.iter_hourly_report_chunks(stats, aggregate=aggregate,
+                                                             detail_limit=detail_limit))
+    return SellerReport(seller_id, chunks, aggregate.total_hourly, aggregate.total_daily,
+                        time.perf_counter() - start)
+
+
+# Состояние процесса-шарда: сборщики его продавцов
+_shard_apis: Dict[str, MockOzonAPI] = {}
+
+
+def _init_shard(catalogs: Dict[str, ArticleRegistry], seed: Optional[int]):
+    if seed is not None:
+        random.seed(seed)
+    _shard_apis.clear()
+    for seller_id, registry in catalogs.items():
+        _shard_apis[seller_id] = MockOzonAPI(registry)
+
+
+def _render_batch(seller_ids: List[str], hour: int, detail_limit: Optional[int],
+                  top_k: int) -> List[SellerReport]:
+    return [
+        render_seller_report(seller_id, _shard_apis[seller_id], hour, detail_limit, top_k)
+        for seller_id in seller_ids
+    ]
+
+
+class ShardedReportRunner:
+    """
+    Сбор и формирование отчетов продавцов в workers процессах
+    Продавец всегда попадает в один и тот же шард (crc32 от id), поэтому
+    счетчики заказов за день копятся в памяти шарда между запусками.
+    Каждый шард - отдельный ProcessPoolExecutor из одного процесса
+    """
+
+    def __init__(self, catalogs: Dict[str, ArticleRegistry], workers: int = 4, batch_size: int = 8,
+                 detail_limit: Optional[int] = None, top_k: int = 3, seed: Optional[int] = None):
+        if workers < 1:
+            raise ValueError("workers должно быть не меньше 1")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.detail_limit = detail_limit
+        self.top_k = top_k
+        self.seed = seed
+
+        self.shards: List[Dict[str, ArticleRegistry]] = [{} for _ in range(workers)]
+        for seller_id, registry in catalogs.items():
+            self.shards[self.shard_of(seller_id)][seller_id] = registry
+        self.executors: List[ProcessPoolExecutor] = []
+
+    def shard_of(self, seller_id: str) -> int:
+        return zlib.crc32(seller_id.encode("utf-8")) % self.workers
+
+    def start(self):
+        """Запуск процессов-шардов"""
+        if self.executors:
+            return
+        self.executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_init_shard,
+                initargs=(shard, None if self.seed is None else self.seed + i)
+            )
+            for i, shard in enumerate(self.shards)
+        ]
+
+    async def warm_up(self):
+        """Ожидание запуска всех процессов (загрузка каталогов в шарды)"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, len, ()) for executor in self.executors))
+
+    async def iter_reports(self, hour: Optional[int] = None) -> AsyncIterator[SellerReport]:
+        """Отчеты всех продавцов за час в порядке готовности"""
+        self.start()
+        if hour is None:
+            hour = datetime.now().hour
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for executor, shard in zip(self.executors, self.shards):
+            seller_ids = list(shard)
+            for i in range(0, len(seller_ids), self.batch_size):
+                futures.append(loop.run_in_executor(
+                    executor, _render_batch, seller_ids[i:i + self.batch_size],
+                    hour, self.detail_limit, self.top_k
+                ))
+
+        for future in asyncio.as_completed(futures):
+            for report in await future:
+                yield report
+
+    async def dispatch_reports(self, dispatcher, channels: List[str], hour: Optional[int] = None) -> int:
+        """Отправка отчетов через NotificationDispatcher по мере готовности"""
+        count = 0
+        async for report in self.iter_reports(hour):
+            await dispatcher.dispatch_chunks(report.chunks, channels=channels)
+            count += 1
+        logger.info(f"Отправлены отчеты {count} продавцов")
+        return count
+
+    def close(self):
+        """Остановка процессов-шардов"""
+        for executor in self.executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.executors = []
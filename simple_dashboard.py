@@ -11,6 +11,9 @@ from datetime import datetime, date, timedelta
 import os
 from dotenv import load_dotenv
 
+from article_registry import get_article_registry
+from cache import AsyncTTLCache
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -19,12 +22,18 @@ logger = logging.getLogger(__name__)
 class SimpleDashboard:
     """Упрощенная веб-панель"""
 
-    def __init__(self, db, host="0.0.0.0", port=8000):
+    def __init__(self, db, host="0.0.0.0", port=8000, cache_ttl=60.0, registry=None):
         self.db = db
+        self.registry = registry if registry is not None else get_article_registry()
         self.host = host
         self.port = port
         self.app = FastAPI(title="Ozon Stats Dashboard")
 
+        # Кэш агрегатов: цифры меняются не чаще раза в час,
+        # а страницу обновляет каждая открытая вкладка раз в 30 секунд
+        self.cache = AsyncTTLCache(ttl=cache_ttl)
+        self.db.order_listeners.append(self.invalidate_order_cache)
+
         # Настраиваем статику
         os.makedirs("static", exist_ok=True)
         self.app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -35,6 +44,11 @@ class SimpleDashboard:
         # Создаем CSS файл
         self.create_css_file()
 
+    def invalidate_order_cache(self):
+        """Сброс кэшированных данных, зависящих от заказов"""
+        self.cache.invalidate("dashboard_counters")
+        self.cache.invalidate("recent_orders")
+
     @staticmethod
     def create_css_file():
         """Создание CSS файла"""
@@ -398,6 +412,14 @@ class SimpleDashboard:
             users = await self.get_users()
             return {"users": users}
 
+        @self.app.get("/api/query-stats")
+        async def get_query_stats():
+            return {"queries": self.db.get_query_stats()}
+
+        @self.app.get("/api/cache-stats")
+        async def get_cache_stats():
+            return {"cache": self.cache.get_metrics()}
+
         @self.app.post("/api/test-report")
         async def test_report():
             return {"message": "Тестовый отчет отправлен в Telegram"}
@@ -473,59 +495,57 @@ class SimpleDashboard:
         html += '</table>'
         return html
 
+    async def fetch_dashboard_counters(self):
+        """Запрос счетчиков дашборда из БД"""
+        counters = await self.db.get_dashboard_counters(date.today())
+        if counters is None:
+            # Не кэшируем ошибку - следующий запрос снова пойдет в БД
+            raise RuntimeError("счетчики дашборда недоступны")
+        return counters
+
     async def get_dashboard_stats(self):
         """Получение статистики для дашборда"""
         try:
-            async with self.db.pool.acquire() as conn:
-                today = date.today()
-
-                # Заказов сегодня
-                today_orders = await conn.fetchval("""
-                    SELECT COALESCE(SUM(orders_count), 0)
-                    FROM daily_stats 
-                    WHERE date = $1
-                """, today) or 0
-
-                # Активных пользователей
-                active_users = await conn.fetchval("""
-                    SELECT COUNT(*) 
-                    FROM bot_users 
-                    WHERE is_active = TRUE
-                """) or 0
-
-                # Всего товаров
-                total_products = await conn.fetchval("""
-                    SELECT COUNT(*) FROM articles
-                """) or 10  # По умолчанию 10 тестовых товаров
-
-                # Следующий отчет
-                now = datetime.now()
-                next_hour = (now.hour + 1) % 24
-
-                stats = [
-                    {
-                        "label": "Заказов сегодня",
-                        "value": today_orders,
-                        "description": "Сумма всех заказов"
-                    },
-                    {
-                        "label": "Активных пользователей",
-                        "value": active_users,
-                        "description": "Подписаны на отчеты"
-                    },
-                    {
-                        "label": "Отслеживаемых товаров",
-                        "value": total_products,
-                        "description": "В базе данных"
-                    },
-                    {
-                        "label": "Следующий отчет",
-                        "value": f"{next_hour}:30",
-                        "description": "Время отправки"
-                    }
-                ]
+            counters = await self.cache.get_or_load("dashboard_counters", self.fetch_dashboard_counters)
+
+            # Следующий отчет
+            now = datetime.now()
+            next_hour = (now.hour + 1) % 24
+
+            stats = [
+                {
+                    "label": "Заказов сегодня",
+                    "value": counters["today_orders"],
+                    "description": "Сумма всех заказов"
+                },
+                {
+                    "label": "Выручка сегодня",
+                    "value": f"{counters['today_revenue']:,.0f}₽",
+                    "description": "По текущим ценам"
+                },
+                {
+                    "label": "Средний чек",
+                    "value": f"{counters['avg_order_value']:,.0f}₽",
+                    "description": "Выручка / заказы"
+                },
+                {
+                    "label": "Подписчиков",
+                    "value": f"{counters['subscribers']} / {counters['active_users']}",
+                    "description": "Подписаны на отчеты / активных"
+                },
+                {
+                    "label": "Отслеживаемых товаров",
+                    "value": counters["total_products"] or len(self.registry),
+                    "description": "В базе данных"
+                },
+                {
+                    "label": "Следующий отчет",
+                    "value": f"{next_hour}:30",
+                    "description": "Время отправки"
+                }
+            ]
 
-                return stats
+            return stats
 
         except Exception as e:
             logger.error(f"Ошибка получения статистики: {e}")
@@ -537,14 +557,24 @@ class SimpleDashboard:
                     "description": "Нет данных"
                 },
                 {
-                    "label": "Активных пользователей",
-                    "value": "0",
+                    "label": "Выручка сегодня",
+                    "value": "0₽",
+                    "description": "Нет данных"
+                },
+                {
+                    "label": "Средний чек",
+                    "value": "0₽",
+                    "description": "Нет данных"
+                },
+                {
+                    "label": "Подписчиков",
+                    "value": "0 / 0",
                     "description": "Нет данных"
                 },
                 {
                     "label": "Отслеживаемых товаров",
-                    "value": "10",
-                    "description": "Тестовые данные"
+                    "value": str(len(self.registry)),
+                    "description": "Из реестра товаров"
                 },
                 {
                     "label": "Следующий отчет",
@@ -556,21 +586,11 @@ class SimpleDashboard:
     async def get_recent_orders(self):
         """Получение последних заказов"""
         try:
-            # Используем тестовые данные из коллектора
-            from ozon_stats_bot import StatsCollector
-            collector = StatsCollector()
-            stats = collector.collect_current_stats()  # Возвращает список объектов ArticleStats
-
-            orders = []
-            for item in stats:
-                if item.hourly_orders > 0:  # item - это объект ArticleStats
-                    orders.append({
-                        "article_code": item.article,
-                        "article_name": item.name,
-                        "orders_count": item.hourly_orders,
-                        "price": f"{item.price:.2f}",
-                        "hour": datetime.now().hour
-                    })
+            # Читаем накопленную статистику из daily_stats, а не генерируем заново
+            orders = await self.cache.get_or_load(
+                "recent_orders",
+                lambda: self.db.get_recent_orders(date.today(), limit=10)
+            )
 
             # Если нет заказов, создаем тестовые данные
             if not orders:
@@ -598,7 +618,7 @@ class SimpleDashboard:
                     }
                 ]
 
-            return sorted(orders, key=lambda x: x['orders_count'], reverse=True)[:10]
+            return orders
 
         except Exception as e:
             logger.error(f"Ошибка получения заказов: {e}")
@@ -620,51 +640,55 @@ class SimpleDashboard:
                 }
             ]
 
+    async def fetch_users(self):
+        """Запрос последних активных пользователей из БД"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetch("""
+                SELECT first_name, username, subscribed_to_daily, last_active
+                FROM bot_users
+                ORDER BY last_active DESC
+                LIMIT 10
+            """)
+
     async def get_users(self):
         """Получение пользователей"""
         try:
-            async with self.db.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT first_name, username, subscribed_to_daily, last_active
-                    FROM bot_users
-                    ORDER BY last_active DESC
-                    LIMIT 10
-                """)
+            rows = await self.cache.get_or_load("users", self.fetch_users)
 
+            users = [
+                {
+                    "first_name": row["first_name"],
+                    "username": row["username"],
+                    "subscribed_to_daily": row["subscribed_to_daily"],
+                    "last_active": row["last_active"]
+                }
+                for row in rows
+            ]
+
+            # Если нет пользователей, создаем тестовые данные
+            if not users:
                 users = [
                     {
-                        "first_name": row["first_name"],
-                        "username": row["username"],
-                        "subscribed_to_daily": row["subscribed_to_daily"],
-                        "last_active": row["last_active"]
+                        "first_name": "Иван",
+                        "username": "ivan_ozon",
+                        "subscribed_to_daily": True,
+                        "last_active": datetime.now()
+                    },
+                    {
+                        "first_name": "Мария",
+                        "username": "maria_shopper",
+                        "subscribed_to_daily": True,
+                        "last_active": datetime.now() - timedelta(hours=2)
+                    },
+                    {
+                        "first_name": "Алексей",
+                        "username": None,
+                        "subscribed_to_daily": False,
+                        "last_active": datetime.now() - timedelta(days=1)
                     }
-                    for row in rows
                 ]
 
-                # Если нет пользователей, создаем тестовые данные
-                if not users:
-                    users = [
-                        {
-                            "first_name": "Иван",
-                            "username": "ivan_ozon",
-                            "subscribed_to_daily": True,
-                            "last_active": datetime.now()
-                        },
-                        {
-                            "first_name": "Мария",
-                            "username": "maria_shopper",
-                            "subscribed_to_daily": True,
-                            "last_active": datetime.now() - timedelta(hours=2)
-                        },
-                        {
-                            "first_name": "Алексей",
-                            "username": None,
-                            "subscribed_to_daily": False,
-                            "last_active": datetime.now() - timedelta(days=1)
-                        }
-                    ]
-
-                return users
+            return users
 
         except Exception as e:
             logger.error(f"Ошибка получения пользователей: {e}")
@@ -703,14 +727,42 @@ async def run_simple_dashboard():
         port=int(os.getenv("DB_PORT", "5432")),
         database=os.getenv("DB_NAME", "ozon_bot_db"),
         user=os.getenv("DB_USER", "ozon_bot_user"),
-        password=os.getenv("DB_PASSWORD", "password123")
+        password=os.getenv("DB_PASSWORD", "password123"),
+        min_pool_size=int(os.getenv("DB_POOL_MIN", "1")),
+        max_pool_size=int(os.getenv("DB_POOL_MAX", "10"))
     )
 
     await db.connect()
 
-    dashboard = SimpleDashboard(db, host="0.0.0.0", port=8000)
+    # Загружаем общий реестр товаров из БД
+    registry = get_article_registry()
+    await registry.refresh_from_db(db)
+    # и дозагружаем изменения по таймеру
+    refresh = asyncio.create_task(
+        registry.run_refresh(db, float(os.getenv("ARTICLES_REFRESH_INTERVAL", "60")))
+    )
+
+    dashboard = SimpleDashboard(db, host="0.0.0.0", port=8000, registry=registry)
+
+    # Режим webhook: бот работает в том же сервере, цикле событий и пуле БД
+    bot_app = None
+    if os.getenv("TELEGRAM_MODE") == "webhook":
+        from telegram_bot import build_application, mount_webhook, start_webhook, stop_webhook
+
+        bot_app = build_application(db=db, webhook=True)
+        mount_webhook(dashboard.app, bot_app)
+        await start_webhook(bot_app)
+
     print("🌐 Упрощенная веб-панель запущена: http://localhost:8000")
-    await dashboard.run()
+    try:
+        await dashboard.run()
+    finally:
+        if bot_app is not None:
+            await stop_webhook(bot_app)
+        refresh.cancel()
+        await asyncio.gather(refresh, return_exceptions=True)
+        # Пул принадлежит панели: закрытие сбрасывает и накопленную активность пользователей
+        await db.close()
 
 
 if __name__ == "__main__":
@@ -4,15 +4,32 @@ Telegram бот для Ozon статистики - с работающим ме
 import asyncio
 import logging
 from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, MessageHandler, ContextTypes, TypeHandler, filters
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
 import os
+from itertools import islice
+from typing import Any, Awaitable, Callable, Optional, Tuple
 from dotenv import load_dotenv
 
+from article_registry import get_article_registry
+from bot_router import BotRouter
+from cache import AsyncTTLCache
+from database import Database
+
 # Настройки
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+# Адрес Bot API (для локальных тестов - фейковый сервер)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+# Режим webhook: обновления приходят в маршрут веб-панели
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_PATH = "/telegram/webhook"
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# Период дозагрузки изменившихся товаров из БД, с
+ARTICLES_REFRESH_INTERVAL = float(os.getenv("ARTICLES_REFRESH_INTERVAL", "60"))
 
 # Логирование
 logging.basicConfig(
@@ -21,12 +38,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Готовые ответы на команды по ключу (команда, час): всплеск нажатий
+# одной кнопки дает один запрос к БД, а не по запросу на пользователя
+response_cache = AsyncTTLCache(ttl=60.0, max_size=256)
+
+UNAVAILABLE_TEXT = "⚠️ Статистика временно недоступна, попробуйте позже"
+
+
+def get_db(context: ContextTypes.DEFAULT_TYPE) -> Optional[Database]:
+    """Общий пул БД приложения (создается в on_startup)"""
+    return context.application.bot_data.get("db")
+
+
+async def cached_response(command: str, render: Callable[[], Awaitable[Any]]) -> Any:
+    """Ответ на команду из кэша или render() при промахе"""
+    hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+    return await response_cache.get_or_load((command, hour), render)
+
+
+def format_money(value: float) -> str:
+    return f"{value:,.0f}₽"
+
+
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отметка активности пользователя при любом обновлении (запись в БД - пакетами)"""
+    db = get_db(context)
+    chat = update.effective_chat
+    if db is not None and db.activity_tracker is not None and chat is not None:
+        db.activity_tracker.touch(chat.id)
+
 
 # ========== КОМАНДЫ ==========
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /start"""
     user = update.effective_user
 
+    db = get_db(context)
+    if db is not None:
+        await db.save_user(update.effective_chat.id, user.username, user.first_name, user.last_name)
+
     # Основное приветственное сообщение
     await update.message.reply_text(
         f"👋 Привет, {user.first_name}!\n\n"
@@ -35,81 +85,129 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🌐 Веб-панель: http://localhost:8000"
     )
 
-    # СОЗДАЕМ REPLY KEYBOARD (постоянное меню внизу)
-    keyboard = [
-        [KeyboardButton("📊 Текущая статистика")],
-        [KeyboardButton("📈 Отчет за день"), KeyboardButton("📋 Список товаров")],
-        [KeyboardButton("✅ Подписаться"), KeyboardButton("❌ Отписаться")],
-        [KeyboardButton("❓ Помощь")]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-
+    # REPLY KEYBOARD (постоянное меню внизу) строится из таблицы действий
     await update.message.reply_text(
         "👇 Выберите действие в меню:",
-        reply_markup=reply_markup
+        reply_markup=router.keyboard()
     )
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /help"""
+    """Команда /help (функции и команды - из таблицы действий)"""
     await update.message.reply_text(
         "🤖 *Ozon Stats Bot*\n\n"
         "📊 *Основные функции:*\n"
-        "• 📊 Текущая статистика\n"
-        "• 📈 Отчет за день\n"
-        "• 📋 Список товаров\n"
-        "• ✅/❌ Подписка на отчеты\n\n"
+        f"{router.button_list()}\n\n"
         "🕐 *Расписание:*\n"
         "• Часовые отчеты: каждый час\n"
         "• Веб-панель: http://localhost:8000\n\n"
         "📞 *Команды:*\n"
-        "/start - обновить меню\n"
-        "/stats - статистика\n"
-        "/report - отчет\n"
-        "/subscribe - подписка",
+        f"{escape_markdown(router.command_list())}",
         parse_mode=ParseMode.MARKDOWN
     )
 
 
-async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /stats"""
-    stats = (
+async def render_stats(db: Database) -> str:
+    """Текущая статистика: итоги дня и топ товаров за текущий час"""
+    now = datetime.now()
+    counters = await db.get_dashboard_counters(now.date())
+    if counters is None:
+        raise RuntimeError("счетчики недоступны")
+    hourly = await db.get_hourly_stats(now.date(), now.hour)
+
+    orders = counters["today_orders"]
+    average = counters["today_revenue"] / orders if orders else 0
+    registry = get_article_registry()
+    top = "\n".join(
+        f"{i}. {escape_markdown(registry.get_name(stat.article_code, stat.article_code))} - {stat.orders_count} заказов"
+        for i, stat in enumerate(hourly[:3], 1)
+    ) or "нет заказов за час"
+
+    return (
         "📊 *Текущая статистика*\n"
-        f"🕐 {datetime.now().strftime('%d.%m.%Y %H:%M')}\n\n"
+        f"🕐 {now.strftime('%d.%m.%Y %H:%M')}\n\n"
         "📈 *Заказы за сегодня:*\n"
-        "• Всего: 15\n"
-        "• За час: 3\n"
-        "• Средний чек: 12,456₽\n\n"
+        f"• Всего: {orders}\n"
+        f"• За час: {sum(stat.orders_count for stat in hourly)}\n"
+        f"• Средний чек: {format_money(average)}\n\n"
         "🏆 *Топ товары:*\n"
-        "1. Смартфон Xiaomi - 5 заказов\n"
-        "2. Наушники JBL - 3 заказа\n"
-        "3. Ноутбук ASUS - 2 заказа\n\n"
+        f"{top}\n\n"
         "🌐 *Веб-панель:* http://localhost:8000"
     )
-    await update.message.reply_text(stats, parse_mode=ParseMode.MARKDOWN)
 
 
-async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /report"""
-    report = (
+async def render_report(db: Database) -> str:
+    """Отчет за день: заказы, выручка и топ-3 товаров"""
+    now = datetime.now()
+    counters = await db.get_dashboard_counters(now.date())
+    if counters is None:
+        raise RuntimeError("счетчики недоступны")
+    totals = await db.get_daily_total(now.date())
+
+    orders = counters["today_orders"]
+    revenue = counters["today_revenue"]
+    registry = get_article_registry()
+    top = "\n".join(
+        f"{i}. {escape_markdown(registry.get_name(code, code))} ({count} заказов)"
+        for i, (code, count) in enumerate(islice(totals.items(), 3), 1)
+    ) or "нет заказов"
+
+    return (
         "📊 *Отчет Ozon*\n"
-        f"📅 {datetime.now().strftime('%d.%m.%Y %H:%M')}\n\n"
+        f"📅 {now.strftime('%d.%m.%Y %H:%M')}\n\n"
         "📈 *Статистика:*\n"
-        "• Заказов: 127\n"
-        "• Выручка: 1,583,245₽\n"
-        "• Средний чек: 12,466₽\n\n"
+        f"• Заказов: {orders}\n"
+        f"• Выручка: {format_money(revenue)}\n"
+        f"• Средний чек: {format_money(revenue / orders if orders else 0)}\n\n"
         "🏆 *Топ-3:*\n"
-        "1. 📱 Смартфон (28 заказов)\n"
-        "2. 🎧 Наушники (15 заказов)\n"
-        "3. 💻 Ноутбук (12 заказов)\n\n"
+        f"{top}\n\n"
         "🌐 *Детальная статистика:*\n"
         "http://localhost:8000"
     )
-    await update.message.reply_text(report, parse_mode=ParseMode.MARKDOWN)
+
+
+async def reply_cached(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str,
+                       render: Callable[[Database], Awaitable[str]]):
+    """Ответ из общего кэша; при недоступной БД - сообщение об ошибке"""
+    db = get_db(context)
+    try:
+        if db is None:
+            raise RuntimeError("нет подключения к БД")
+        text = await cached_response(command, lambda: render(db))
+    except Exception as e:
+        logger.error(f"Ошибка формирования ответа {command}: {e}")
+        await update.message.reply_text(UNAVAILABLE_TEXT)
+        return
+    await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /stats"""
+    await reply_cached(update, context, "stats", render_stats)
+
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /report"""
+    await reply_cached(update, context, "report", render_report)
+
+
+async def set_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE, value: bool) -> bool:
+    """Сохранение подписки на ежедневные отчеты"""
+    db = get_db(context)
+    if db is None:
+        return False
+    chat_id = update.effective_chat.id
+    user = update.effective_user
+    # Пользователь мог не нажимать /start - строка в bot_users нужна для UPDATE
+    await db.save_user(chat_id, user.username, user.first_name, user.last_name)
+    return await db.update_user_subscription(chat_id, "daily", value)
 
 
 async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /subscribe"""
+    if not await set_subscription(update, context, True):
+        await update.message.reply_text(UNAVAILABLE_TEXT)
+        return
     await update.message.reply_text(
         "✅ *Подписка оформлена!*\n\n"
         "Вы будете получать:\n"
@@ -121,53 +219,251 @@ async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def products_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /products"""
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /unsubscribe"""
+    if not await set_subscription(update, context, False):
+        await update.message.reply_text(UNAVAILABLE_TEXT)
+        return
     await update.message.reply_text(
-        "🛒 *Список отслеживаемых товаров:*\n\n"
-        "1. `123456` - Смартфон Xiaomi Redmi Note 12\n"
-        "2. `789012` - Наушники JBL Tune 510BT\n"
-        "3. `345678` - Ноутбук ASUS VivoBook 15\n"
-        "4. `901234` - Часы Apple Watch Series 9\n"
-        "5. `567890` - Планшет Samsung Galaxy Tab S9\n\n"
-        "📊 *Всего:* 10 товаров",
+        "❌ *Вы отписались от отчетов.*\n\n"
+        "Вы больше не будете получать автоматические отчеты.\n"
+        "Для подписки нажмите ✅ Подписаться",
         parse_mode=ParseMode.MARKDOWN
     )
 
 
+PRODUCTS_PAGE_SIZE = 10
+PRODUCTS_CALLBACK = "products:"
+
+
+async def render_products_page(db: Database, after: Optional[str] = None,
+                               before: Optional[str] = None) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """
+    Страница списка товаров и кнопки перехода
+    Курсор - артикул первого/последнего товара страницы, поэтому каждая
+    страница - один запрос по диапазону первичного ключа без OFFSET.
+    Общее число товаров берется из реестра, загруженного при запуске
+    """
+    articles, has_more = await db.get_articles_page(after=after, before=before, limit=PRODUCTS_PAGE_SIZE)
+    if not articles:
+        return "🛒 *Список товаров пуст*", None
+
+    if before is not None:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+
+    lines = [
+        f"`{article.article_code}` - {escape_markdown(article.article_name)} ({format_money(float(article.current_price or 0))})"
+        for article in articles
+    ]
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"{PRODUCTS_CALLBACK}<:{articles[0].article_code}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"{PRODUCTS_CALLBACK}>:{articles[-1].article_code}"))
+
+    text = (
+        "🛒 *Список отслеживаемых товаров:*\n\n"
+        + "\n".join(lines) + "\n\n"
+        f"📊 *Всего:* {len(get_article_registry())} товаров"
+    )
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def products_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /products - первая страница списка товаров"""
+    db = get_db(context)
+    try:
+        if db is None:
+            raise RuntimeError("нет подключения к БД")
+        text, markup = await cached_response("products", lambda: render_products_page(db))
+    except Exception as e:
+        logger.error(f"Ошибка формирования списка товаров: {e}")
+        await update.message.reply_text(UNAVAILABLE_TEXT)
+        return
+    await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+
+
+async def products_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Нажатие кнопки перехода по страницам списка товаров"""
+    query = update.callback_query
+    direction, _, cursor = query.data[len(PRODUCTS_CALLBACK):].partition(":")
+    db = get_db(context)
+    try:
+        if db is None or direction not in ("<", ">"):
+            raise RuntimeError(f"некорректный запрос страницы {query.data}")
+        text, markup = await cached_response(
+            query.data,
+            lambda: render_products_page(db, after=cursor if direction == ">" else None,
+                                         before=cursor if direction == "<" else None)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка формирования страницы товаров: {e}")
+        await query.answer(UNAVAILABLE_TEXT, show_alert=True)
+        return
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+    except BadRequest as e:
+        # Повторное нажатие той же кнопки: сообщение уже показывает эту страницу
+        if "not modified" not in str(e):
+            raise
+
+
 # ========== ОБРАБОТКА СООБЩЕНИЙ (КНОПОК) ==========
+async def unknown_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Текст не распознан - предлагаем меню"""
+    await update.message.reply_text(
+        "ℹ️ Используйте меню ниже или команды:\n"
+        f"{router.command_list()}"
+    )
+
+
+# Таблица действий: команды, кнопки меню (строка клавиатуры) и обработчики
+router = BotRouter(fallback=unknown_message)
+router.add("start", start, command="start", description="обновить меню")
+router.add("stats", stats_command, command="stats", label="📊 Текущая статистика", row=0,
+           description="статистика")
+router.add("report", report_command, command="report", label="📈 Отчет за день", row=1,
+           description="отчет за день")
+router.add("products", products_command, command="products", label="📋 Список товаров", row=1,
+           description="список товаров")
+router.add("products_page", products_page_callback, callback_prefix=PRODUCTS_CALLBACK)
+router.add("subscribe", subscribe_command, command="subscribe", label="✅ Подписаться", row=2,
+           description="подписка")
+router.add("unsubscribe", unsubscribe_command, command="unsubscribe", label="❌ Отписаться", row=2,
+           description="отписка")
+router.add("help", help_command, command="help", label="❓ Помощь", row=3, description="помощь")
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текстовых сообщений (нажатий на кнопки Reply Keyboard)"""
-    text = update.message.text
-
-    if text == "📊 Текущая статистика":
-        await stats_command(update, context)
-    elif text == "📈 Отчет за день":
-        await report_command(update, context)
-    elif text == "📋 Список товаров":
-        await products_command(update, context)
-    elif text == "✅ Подписаться":
-        await subscribe_command(update, context)
-    elif text == "❌ Отписаться":
-        await update.message.reply_text(
-            "❌ *Вы отписались от отчетов.*\n\n"
-            "Вы больше не будете получать автоматические отчеты.\n"
-            "Для подписки нажмите ✅ Подписаться",
-            parse_mode=ParseMode.MARKDOWN
-        )
-    elif text == "❓ Помощь":
-        await help_command(update, context)
-    else:
-        # Если текст не распознан, предлагаем меню
-        await update.message.reply_text(
-            "ℹ️ Используйте меню ниже или команды:\n"
-            "/start - обновить меню\n"
-            "/stats - статистика\n"
-            "/help - помощь"
-        )
+    await router.handle_text(update, context)
 
 
 # ========== ЗАПУСК БОТА ==========
+async def on_startup(app: Application):
+    """Подключение к БД и загрузка реестра товаров"""
+    if "db" in app.bot_data:
+        # Пул передан снаружи (webhook внутри веб-панели)
+        db = app.bot_data["db"]
+        if db is not None:
+            db.enable_activity_tracker()
+        return
+
+    db = Database(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        database=os.getenv("DB_NAME", "ozon_bot_db"),
+        user=os.getenv("DB_USER", "ozon_bot_user"),
+        password=os.getenv("DB_PASSWORD", "password123"),
+        min_pool_size=int(os.getenv("DB_POOL_MIN", "1")),
+        max_pool_size=int(os.getenv("DB_POOL_MAX", "10"))
+    )
+    if not await db.connect():
+        logger.error("❌ Нет подключения к БД: статистика и подписки недоступны")
+        return
+
+    app.bot_data["db"] = db
+    db.enable_activity_tracker()
+    registry = get_article_registry()
+    await registry.refresh_from_db(db)
+    app.bot_data["registry_refresh"] = asyncio.create_task(registry.run_refresh(db, ARTICLES_REFRESH_INTERVAL))
+
+
+async def on_shutdown(app: Application):
+    """Закрытие пула БД, если он создан ботом"""
+    refresh = app.bot_data.pop("registry_refresh", None)
+    if refresh is not None:
+        refresh.cancel()
+        await asyncio.gather(refresh, return_exceptions=True)
+    if app.bot_data.pop("owns_db", True):
+        db = app.bot_data.pop("db", None)
+        if db is not None:
+            await db.close()
+
+
+def build_application(db: Optional[Database] = None, webhook: bool = False,
+                      concurrent_updates: int = 64) -> Application:
+    """
+    Приложение бота со всеми обработчиками
+    db - общий пул (иначе бот подключается сам в on_startup);
+    webhook - без Updater: обновления кладутся в очередь маршрутом веб-сервера
+    и обрабатываются параллельно (до concurrent_updates одновременно)
+    """
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(f"{TELEGRAM_API_BASE}/bot")
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if webhook:
+        builder = builder.updater(None).concurrent_updates(concurrent_updates)
+    app = builder.build()
+
+    if db is not None:
+        app.bot_data["db"] = db
+        app.bot_data["owns_db"] = False
+
+    # Активность пользователей отмечается до остальных обработчиков
+    app.add_handler(TypeHandler(Update, track_activity), group=-1)
+
+    # Обработчики команд и inline-кнопок из таблицы действий
+    app.add_handlers(router.command_handlers())
+    app.add_handlers(router.callback_handlers())
+
+    # Обработчик текстовых сообщений (кнопок меню)
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    return app
+
+
+def mount_webhook(web_app, bot_app: Application, path: str = TELEGRAM_WEBHOOK_PATH,
+                  secret_token: Optional[str] = TELEGRAM_WEBHOOK_SECRET):
+    """Маршрут FastAPI, принимающий обновления Telegram"""
+    from fastapi import Request, Response
+
+    @web_app.post(path, include_in_schema=False)
+    async def telegram_webhook(request: Request):
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return Response(status_code=403)
+
+        # Отвечаем сразу: обработка идет в задачах приложения бота
+        update = Update.de_json(await request.json(), bot_app.bot)
+        await bot_app.update_queue.put(update)
+        return Response(status_code=200)
+
+    @web_app.get("/api/bot-handler-stats")
+    async def bot_handler_stats():
+        return router.get_metrics()
+
+
+async def start_webhook(bot_app: Application, webhook_url: Optional[str] = TELEGRAM_WEBHOOK_URL,
+                        path: str = TELEGRAM_WEBHOOK_PATH):
+    """Запуск обработки обновлений и регистрация webhook в Telegram"""
+    await bot_app.initialize()
+    await bot_app.start()
+    if bot_app.post_init:
+        await bot_app.post_init(bot_app)
+    if webhook_url:
+        await bot_app.bot.set_webhook(
+            url=webhook_url.rstrip("/") + path,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"🤖 Webhook установлен: {webhook_url.rstrip('/')}{path}")
+
+
+async def stop_webhook(bot_app: Application):
+    """Остановка обработки обновлений"""
+    await bot_app.stop()
+    if bot_app.post_shutdown:
+        await bot_app.post_shutdown(bot_app)
+    await bot_app.shutdown()
+
+
 def main():
     """Основная функция запуска"""
     if not TELEGRAM_TOKEN:
@@ -175,22 +471,15 @@ def main():
         print("Добавьте в .env: TELEGRAM_TOKEN=ваш_токен")
         return
 
+    if os.getenv("TELEGRAM_MODE") == "webhook":
+        print("Режим webhook: бот запускается вместе с веб-панелью (python simple_dashboard.py)")
+        return
+
     # Создаем новый event loop для Windows
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
-
-    # Обработчики команд
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("help", help_command))
-    app.add_handler(CommandHandler("stats", stats_command))
-    app.add_handler(CommandHandler("report", report_command))
-    app.add_handler(CommandHandler("subscribe", subscribe_command))
-    app.add_handler(CommandHandler("products", products_command))
-
-    # Обработчик текстовых сообщений (кнопок меню)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app = build_application()
 
     logger.info("🤖 Бот запущен...")
     print("✅ Telegram бот запущен с рабочим меню!")
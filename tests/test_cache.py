@@ -0,0 +1,82 @@
+"""
+AsyncTTLCache: объединение промахов, отмена ожидающих и инвалидация во время загрузки
+"""
+import asyncio
+
+import pytest
+
+from cache import AsyncTTLCache
+
+
+class SlowLoader:
+    """Загрузчик, который завершается только по сигналу теста"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        value = f"value-{self.calls}"
+        await self.release.wait()
+        return value
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = AsyncTTLCache(ttl=60)
+        loader = SlowLoader()
+        waiters = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        return cache, loader, await asyncio.gather(*waiters)
+
+    cache, loader, results = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert results == ["value-1"] * 5
+    assert cache.misses == 1 and cache.coalesced == 4
+
+
+def test_cancelled_first_waiter_does_not_fail_others():
+    async def scenario():
+        cache = AsyncTTLCache(ttl=60)
+        loader = SlowLoader()
+        first = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        others = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        loader.release.set()
+        results = await asyncio.gather(*others)
+        # Результат сохранен в кэше: повторный запрос не вызывает загрузчик
+        cached = await cache.get_or_load("k", loader)
+        return loader, results, cached
+
+    loader, results, cached = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert results == ["value-1"] * 3
+    assert cached == "value-1"
+
+
+def test_invalidate_during_load_drops_stale_value():
+    async def scenario():
+        cache = AsyncTTLCache(ttl=60)
+        loader = SlowLoader()
+        waiter = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+
+        cache.invalidate("k")
+        loader.release.set()
+        # Ожидающий получает свой результат, но в кэш он не попадает
+        stale = await waiter
+        fresh = await cache.get_or_load("k", loader)
+        return cache, loader, stale, fresh
+
+    cache, loader, stale, fresh = asyncio.run(scenario())
+    assert stale == "value-1"
+    assert fresh == "value-2"
+    assert loader.calls == 2
+    assert cache.get_metrics()["size"] == 1
@@ -0,0 +1,99 @@
+"""
+Журнал состояния сборщика: восстановление, сжатие и обрезка недописанной записи
+"""
+import asyncio
+import os
+import threading
+from array import array
+from datetime import date
+
+from article_registry import ArticleRegistry
+from collector_state import CollectorStateLog
+from ozon_stats_bot import MockOzonAPI, StatsCollector
+
+DAY = date(2026, 5, 4)
+CODES = ["111", "222", "333"]
+
+
+def write_hours(path, hours):
+    log = CollectorStateLog(str(path))
+    for hour, counts, prices in hours:
+        log.append_hour(DAY, hour, CODES, counts, prices)
+    return log
+
+
+def test_load_sums_hours(tmp_path):
+    path = tmp_path / "state.bin"
+    write_hours(path, [(10, [1, 2, 3], [10.0, 20.0, 30.0]), (11, [4, 0, 1], [11.0, 21.0, 31.0])])
+
+    snapshot = CollectorStateLog(str(path)).load()
+    assert snapshot.day == DAY
+    assert snapshot.codes == CODES
+    assert snapshot.counts_for(0)[10:12] == array("i", [1, 4])
+    assert sum(snapshot.counts_for(2)) == 4
+    assert list(snapshot.prices) == [11.0, 21.0, 31.0]
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = tmp_path / "state.bin"
+    write_hours(path, [(10, [1, 2, 3], [10.0, 20.0, 30.0])])
+    valid_size = os.path.getsize(path)
+    write_hours(path, [(11, [5, 5, 5], [11.0, 21.0, 31.0])])
+
+    # Сбой посреди записи: от последней записи остались первые байты
+    with open(path, "r+b") as f:
+        f.truncate(valid_size + 7)
+
+    snapshot = CollectorStateLog(str(path)).load()
+    assert sum(snapshot.counts_for(0)) == 1
+    assert list(snapshot.prices) == [10.0, 20.0, 30.0]
+    assert os.path.getsize(path) == valid_size
+
+
+def test_compaction_keeps_state(tmp_path):
+    path = tmp_path / "state.bin"
+    log = write_hours(path, [(10, [1, 2, 3], [10.0, 20.0, 30.0]), (11, [4, 0, 1], [11.0, 21.0, 31.0])])
+    snapshot = CollectorStateLog(str(path)).load()
+
+    log.compact(DAY, snapshot.codes, snapshot.hourly, snapshot.prices)
+    log.append_hour(DAY, 12, CODES, [1, 1, 1], [12.0, 22.0, 32.0])
+
+    restored = CollectorStateLog(str(path)).load()
+    assert restored.counts_for(1)[10:13] == array("i", [2, 0, 1])
+    assert list(restored.prices) == [12.0, 22.0, 32.0]
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_unknown_format_is_ignored(tmp_path):
+    path = tmp_path / "state.bin"
+    path.write_bytes(b"not a state log")
+    assert CollectorStateLog(str(path)).load() is None
+
+
+def test_async_collect_writes_log_off_loop(tmp_path):
+    registry = ArticleRegistry()
+    for i, code in enumerate(CODES):
+        registry.upsert(code, f"Товар {i}", 100.0)
+    log = CollectorStateLog(str(tmp_path / "state.bin"), compact_every=2)
+    writers = []
+    for name in ("append_hour", "compact"):
+        method = getattr(log, name)
+
+        def record(*args, _method=method):
+            writers.append(threading.current_thread())
+            return _method(*args)
+        setattr(log, name, record)
+
+    api = MockOzonAPI(registry=registry, state_log=log)
+    collector = StatsCollector(api=api)
+
+    async def collect():
+        for _ in range(3):
+            await collector.collect_current_stats_async()
+    asyncio.run(collect())
+
+    # Запись журнала (включая сжатие) ни разу не шла в потоке цикла событий
+    assert len(writers) == 3
+    assert threading.main_thread() not in writers
+    snapshot = CollectorStateLog(str(tmp_path / "state.bin")).load()
+    assert snapshot.codes == CODES
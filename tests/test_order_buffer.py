@@ -0,0 +1,123 @@
+"""
+Буфер заказов: повтор при сбое соединения и отбраковка заказов с ошибкой данных
+"""
+import asyncio
+from datetime import datetime
+
+from database import OrderBuffer, OrderDataError
+
+NOW = datetime(2026, 5, 4, 12, 0)
+
+
+class FakeDB:
+    """save_orders_bulk как у Database: неизвестный артикул - ошибка данных, down - сбой соединения"""
+
+    def __init__(self, known=None):
+        self.known = known
+        self.down = False
+        self.calls = 0
+        self.saved = []
+
+    async def save_orders_bulk(self, orders, raise_data_errors=False):
+        self.calls += 1
+        orders = list(orders)
+        if self.down:
+            return 0
+        if self.known is not None and any(code not in self.known for code, _ in orders):
+            if raise_data_errors:
+                raise OrderDataError("нарушение внешнего ключа")
+            return 0
+        self.saved.extend(orders)
+        return len(orders)
+
+
+def make_buffer(db, **kwargs) -> OrderBuffer:
+    return OrderBuffer(db, flush_interval_ms=1, **kwargs)
+
+
+def test_single_order_survives_outage():
+    db = FakeDB()
+    db.down = True
+    buffer = make_buffer(db)
+
+    async def scenario():
+        await buffer.add("111", NOW)
+        for _ in range(20):
+            assert not await buffer.flush()
+        db.down = False
+        assert await buffer.flush()
+
+    asyncio.run(scenario())
+    assert db.saved == [("111", NOW)]
+    assert buffer.get_metrics()["dropped_orders"] == 0
+
+
+def test_all_bad_batch_is_dropped_once():
+    db = FakeDB(known={"111"})
+    buffer = make_buffer(db)
+
+    async def scenario():
+        await buffer.add("999", NOW)
+        await buffer.add("998", NOW)
+        assert await buffer.flush()
+        assert await buffer.flush()
+
+    asyncio.run(scenario())
+    # Пакет целиком и два заказа по одному
+    assert db.calls == 3
+    assert list(buffer.dead_letter) == [("999", NOW), ("998", NOW)]
+    assert buffer.get_metrics()["pending"] == 0
+
+
+def test_bad_order_is_isolated_from_batch():
+    db = FakeDB(known={f"{i}" for i in range(10)})
+    buffer = make_buffer(db)
+
+    async def scenario():
+        for i in range(10):
+            await buffer.add("bad" if i == 3 else f"{i}", NOW)
+        assert await buffer.flush()
+
+    asyncio.run(scenario())
+    assert len(db.saved) == 9
+    assert list(buffer.dead_letter) == [("bad", NOW)]
+    assert buffer.get_metrics()["dropped_orders"] == 1
+
+
+def test_outage_during_isolation_requeues():
+    db = FakeDB(known={"111"})
+    buffer = make_buffer(db)
+    real_save = db.save_orders_bulk
+
+    async def failing_after_first(orders, raise_data_errors=False):
+        # Первый вызов - ошибка данных, затем соединение пропадает
+        try:
+            return await real_save(orders, raise_data_errors)
+        finally:
+            db.down = True
+
+    db.save_orders_bulk = failing_after_first
+
+    async def scenario():
+        await buffer.add("111", NOW)
+        await buffer.add("999", NOW)
+        assert not await buffer.flush()
+
+    asyncio.run(scenario())
+    assert buffer.get_metrics()["pending"] == 2
+    assert buffer.get_metrics()["dropped_orders"] == 0
+
+
+def test_add_does_not_block_on_bad_order():
+    db = FakeDB(known={f"{i}" for i in range(100)})
+    buffer = make_buffer(db, max_batch_size=10, max_pending=10)
+
+    async def scenario():
+        buffer.start()
+        for i in range(100):
+            await buffer.add("bad" if i == 5 else f"{i}", NOW)
+        await buffer.close()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert len(db.saved) == 99
+    assert buffer.get_metrics()["dropped_orders"] == 1
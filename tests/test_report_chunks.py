@@ -0,0 +1,34 @@
+"""
+Разбиение отчета на сообщения Telegram: длина в единицах UTF-16
+"""
+from ozon_stats_bot import ReportGenerator
+
+
+def utf16_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def test_emoji_lines_fit_utf16_limit():
+    # Каждая строка - 30 символов, но 60 единиц UTF-16
+    lines = ["🏆" * 20 + "x" * 10 for _ in range(50)]
+    chunks = list(ReportGenerator.split_into_messages(lines, max_length=200))
+
+    assert all(utf16_length(chunk) <= 200 for chunk in chunks)
+    # По символам все строки влезли бы в одно сообщение
+    assert len(chunks) > 1
+    assert "\n".join(chunks) == "\n".join(lines)
+
+
+def test_long_emoji_line_is_cut():
+    line = "📊" * 500
+    chunks = list(ReportGenerator.split_into_messages(["заголовок", line, "итог"], max_length=100))
+
+    assert all(utf16_length(chunk) <= 100 for chunk in chunks)
+    assert chunks[0] == "заголовок"
+    assert "".join(chunks[1:-1]) == line
+    assert chunks[-1] == "итог"
+
+
+def test_exact_limit_is_not_split():
+    lines = ["😀" * 25, "😀" * 24]  # 50 + 1 + 48 = 99 единиц
+    assert list(ReportGenerator.split_into_messages(lines, max_length=99)) == ["\n".join(lines)]
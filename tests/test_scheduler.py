@@ -0,0 +1,128 @@
+"""
+Планировщик: переходы на летнее/зимнее время и политики пропущенных запусков
+Время подменяется: часы планировщика и asyncio.sleep сдвигают общий счетчик
+"""
+import asyncio
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import scheduler
+from scheduler import CATCH_UP_ALL, CATCH_UP_LATEST, CATCH_UP_SKIP, CronSchedule, Scheduler
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def at(*args, tz=timezone.utc) -> float:
+    return datetime(*args, tzinfo=tz).timestamp()
+
+
+class FakeClock:
+    """Часы, которые двигает только подмененный asyncio.sleep"""
+
+    def __init__(self, now: float, until: float):
+        self.now = now
+        self.until = until
+        self.scheduler = None
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    real_sleep = asyncio.sleep
+
+    def make(now: float, until: float) -> FakeClock:
+        clock = FakeClock(now, until)
+
+        async def sleep(delay, result=None):
+            clock.now += max(delay, 0)
+            if clock.now >= clock.until:
+                clock.scheduler.stop()
+            await real_sleep(0)
+            return result
+
+        monkeypatch.setattr(scheduler.asyncio, "sleep", sleep)
+        return clock
+
+    return make
+
+
+def run_scheduler(sch: Scheduler, clock: FakeClock):
+    clock.scheduler = sch
+    asyncio.run(sch.run())
+
+
+def test_dst_gap_moves_run_after_transition():
+    schedule = CronSchedule.at(30, [2], tz=BERLIN)
+    fire_at = schedule.next_after(at(2026, 3, 28, 12, tz=BERLIN))
+    # 02:30 29 марта не существует: запуск в 03:30 летнего времени
+    assert datetime.fromtimestamp(fire_at, BERLIN) == datetime(2026, 3, 29, 3, 30, tzinfo=BERLIN)
+
+
+def test_dst_fold_runs_repeated_hour_once():
+    schedule = CronSchedule.at(30, [2], tz=BERLIN)
+    first = schedule.next_after(at(2026, 10, 24, 12, tz=BERLIN))
+    assert first == at(2026, 10, 25, 0, 30)
+    # Повтор 02:30 по зимнему времени пропускается
+    assert schedule.next_after(first) == at(2026, 10, 26, 1, 30)
+
+
+@pytest.mark.parametrize("policy, runs, missed, caught_up", [
+    (CATCH_UP_SKIP, 1, 3, 0),
+    (CATCH_UP_LATEST, 2, 2, 1),
+    (CATCH_UP_ALL, 4, 0, 3),
+])
+def test_catch_up_policies(fake_time, policy, runs, missed, caught_up):
+    clock = fake_time(at(2026, 5, 4, 10), until=at(2026, 5, 4, 14))
+    slots = []
+
+    async def job():
+        slots.append(clock.now)
+        if len(slots) == 1:
+            # Первый запуск (10:30) длится больше трех часов
+            clock.now = at(2026, 5, 4, 13, 45)
+
+    sch = Scheduler(clock=clock)
+    sch.add_job("hourly", CronSchedule.at(30, tz=timezone.utc), job, catch_up=policy, misfire_grace=60)
+    run_scheduler(sch, clock)
+
+    metrics = sch.get_metrics()["hourly"]
+    assert (metrics["runs"], metrics["missed"], metrics["caught_up"]) == (runs, missed, caught_up)
+
+
+def test_guard_waits_for_new_leader(fake_time):
+    clock = fake_time(at(2026, 5, 4, 10), until=at(2026, 5, 4, 11))
+    answers = [None, None, True]
+    runs = []
+
+    async def guard(name, slot):
+        return answers.pop(0)
+
+    async def job():
+        runs.append(clock.now)
+
+    sch = Scheduler(clock=clock, guard=guard, guard_retry_interval=5)
+    sch.add_job("hourly", CronSchedule.at(30, tz=timezone.utc), job, misfire_grace=60)
+    run_scheduler(sch, clock)
+
+    assert runs == [at(2026, 5, 4, 10, 30, 10)]
+    assert sch.get_metrics()["hourly"]["fenced"] == 0
+
+
+def test_guard_gives_up_after_misfire_grace(fake_time):
+    clock = fake_time(at(2026, 5, 4, 10), until=at(2026, 5, 4, 11))
+
+    async def guard(name, slot):
+        return None
+
+    async def job():
+        raise AssertionError("запуск без лидера")
+
+    sch = Scheduler(clock=clock, guard=guard, guard_retry_interval=5)
+    sch.add_job("hourly", CronSchedule.at(30, tz=timezone.utc), job, misfire_grace=60)
+    run_scheduler(sch, clock)
+
+    assert sch.get_metrics()["hourly"]["fenced"] == 1